@@ -0,0 +1,148 @@
+#
+#   uArm Multi-Arm Controller
+#   =========================
+#
+#   Drives several uArms at once from one program. Each arm has its own I/O
+#   thread and command queue: commands for an arm run one after the other, in
+#   the order they were given, while the other arms carry on with theirs. So a
+#   slow drawBoard on one arm never holds up the others.
+#
+#   Every command returns straight away with a concurrent.futures.Future, which
+#   holds the command's result (or exception) once the arm has done it:
+#
+#       arms = armController.ArmController(["/dev/ttyACM0", "/dev/ttyACM1"])
+#       arms["/dev/ttyACM0"].drawBoard()
+#       arms["/dev/ttyACM1"].drawCross(4)
+#       arms.wait()                          #wait until every arm has finished
+#       arms.close()
+#
+#   eg:  python3 armController.py /dev/ttyACM0 /dev/ttyACM1 /dev/ttyACM2 /dev/ttyACM3 --draw-board
+
+import argparse     #for the command line options
+import concurrent.futures   #each command's result
+import queue        #each arm's command queue
+import threading    #one I/O thread for each arm
+import uArmFunctions     #library of functions to control uArm
+
+class Arm:
+    """ One uArm, with an I/O thread that runs its queued commands in order.
+            submit(func, *args)  - queue func(*args), returns a Future
+            command(func, *args) - queue func(uArm, *args) (any uArmFunctions function), returns a Future
+            wait()               - wait until every queued command has been done
+            close()              - finish the queued commands, then stop the thread and close the port
+        goHome, goVision, drawBoard, drawNought, drawCross, drawWinLine and sendGCode queue the
+        uArmFunctions function of the same name.
+    """
+
+    def __init__(self, port):
+        self.port = port
+        self.uArm = None                    #the serial port, opened by the arm's thread
+        self.commands = queue.Queue()       #(future, func, args), None to stop
+        self.thread = threading.Thread(target=self.run, name="uArm " + port, daemon=True)
+        self.thread.start()
+        self.opened = self.submit(self.open)
+
+    def open(self):
+        self.uArm = uArmFunctions.openUArm(self.port)
+
+    def submit(self, func, *args):
+        future = concurrent.futures.Future()
+        self.commands.put((future, func, args))
+        return future
+
+    def command(self, func, *args):
+        return self.submit(lambda: func(self.uArm, *args))
+
+    def goHome(self):
+        return self.command(uArmFunctions.goHome)
+
+    def goVision(self):
+        return self.command(uArmFunctions.goVision)
+
+    def drawBoard(self):
+        return self.command(uArmFunctions.drawBoard)
+
+    def drawNought(self, whichSquare):
+        return self.command(uArmFunctions.drawNought, whichSquare)
+
+    def drawCross(self, whichSquare):
+        return self.command(uArmFunctions.drawCross, whichSquare)
+
+    def drawWinLine(self, winLine):
+        return self.command(uArmFunctions.drawWinLine, winLine)
+
+    def sendGCode(self, gCode):
+        return self.command(uArmFunctions.sendGCode, gCode)
+
+    def wait(self):
+        self.submit(lambda: None).result()
+
+    def close(self):
+        self.commands.put(None)
+        self.thread.join()
+        if self.uArm is not None:
+            uArmFunctions.closeUArm(self.uArm)
+
+    def run(self):
+        while True:
+            item = self.commands.get()
+            if item is None:
+                return
+            future, func, args = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args))
+            except BaseException as error:
+                print("uArm", self.port, "command failed:", repr(error))    #in case nobody is waiting for the result
+                future.set_exception(error)
+
+class ArmController:
+    """ Several uArms, each with its own Arm (thread and command queue), looked up by port """
+
+    def __init__(self, ports):
+        self.arms = {port: Arm(port) for port in ports}
+
+    def __getitem__(self, port):
+        return self.arms[port]
+
+    def __iter__(self):
+        return iter(self.arms.values())
+
+    def __len__(self):
+        return len(self.arms)
+
+    def everyArm(self, method, *args):
+        """ Queues the same command on every arm, returns {port: Future} """
+        return {arm.port: getattr(arm, method)(*args) for arm in self}
+
+    def wait(self):
+        """ Waits until every arm has done all its queued commands """
+        for arm in self:
+            arm.wait()
+
+    def close(self):
+        for arm in self:
+            arm.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive several uArms at once")
+    parser.add_argument("ports", nargs="+", help="serial ports of the uArms (eg: /dev/ttyACM0 /dev/ttyACM1)")
+    parser.add_argument("--draw-board", action="store_true", help="draw a board with every arm")
+    parser.add_argument("--gcode", action="append", default=[], help="g-code to send to every arm (can be repeated)")
+    parser.add_argument("--gcode-trace", help="record every line sent to and received from the arms in this file")
+    args = parser.parse_args()
+
+    uArmFunctions.TRACE_FILE = args.gcode_trace
+
+    arms = ArmController(args.ports)
+    for gCode in args.gcode:
+        arms.everyArm("sendGCode", gCode)
+    if args.draw_board:
+        arms.everyArm("drawBoard")
+    arms.everyArm("goHome")
+    arms.wait()
+    arms.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+#
+#   Noughts and Crosses Batch Simulator
+#   ===================================
+#
+#   Plays thousands of games at once using numpy, for big training runs and
+#   evaluation sweeps where calling nextMoves/isGameWon for every game in Python
+#   is too slow.
+#
+#   All the games in a batch start together and move in lockstep, so on every
+#   "ply" it is the same player's turn in every game that is still going:
+#
+#       boards    (N, 9) int8   X = 1, O = -1, empty = 0 (squares numbered as usual)
+#       lineSums  (N, 8)        boards @ LINES.T, so a line summing to 3 is a win for X, -3 for O
+#       history   (N, 9) int16  canonical index (gameFunctions.INDEX_OF) of the board after each move
+#
+#   The experience is held as arrays indexed by canonical index (a vote array
+#   and a "known" array for each player) instead of dictionaries. Computer moves
+#   follow the same rules as findBestMove (take a winning move, else one of the
+#   moves with the most votes above 0, else a random move), and finished games
+#   are learnt from with the same votes as learnFromGame, applied with scatter-adds
+#   a batch at a time (wins and losses first, then draws).
+#
+#   eg:  python3 batchSimulator.py --games 1000000 --o random
+#        python3 batchSimulator.py --games 100000 --experience experience296.txt --no-learn
+
+import argparse     #for the command line options
+import time         #for timing the games
+import numpy as np  #for the arrays of games
+import gameFunctions     #library of game rules and learning (the game engine)
+
+#the 8 winning lines, one row each, one column per square
+LINES = np.array([[(line >> i) & 1 for i in range(9)] for line, _ in gameFunctions.WIN_LINES], dtype=np.int8)
+
+#value of each square's digit in the base 3 board code (same as gameFunctions.tfInt)
+POW3 = np.array([3 ** (8 - i) for i in range(9)], dtype=np.int32)
+
+#digit for each square value, indexed by (square value % 3): empty = 0, X (1) = 2, O (-1 -> 2) = 1
+DIGIT = np.array([0, 2, 1], dtype=np.int32)
+
+#board code -> canonical index (-1 for positions no real game can reach)
+CODE_INDEX = np.full(3 ** 9, -1, dtype=np.int16)
+for brd, index in gameFunctions.INDEX_OF.items():
+    CODE_INDEX[gameFunctions.tfInt(brd)] = index
+del brd, index
+
+NUM_ROOTS = len(gameFunctions.ROOTS)
+
+def experienceToArrays(experience):
+    """ Returns (votes, known) arrays for an experience list of root boards
+        (boards that aren't root boards of a real game are left out)
+    """
+    if isinstance(experience, gameFunctions.ExperienceStore) and not experience.extra:
+        #already arrays indexed by canonical index, so just copy them
+        votes = np.array(experience.votes, dtype=np.int32)
+        known = np.unpackbits(np.frombuffer(experience.known, dtype=np.uint8), bitorder="little")[:NUM_ROOTS].astype(bool)
+        return votes, known
+
+    votes = np.zeros(NUM_ROOTS, dtype=np.int32)
+    known = np.zeros(NUM_ROOTS, dtype=bool)
+    for brd in experience:
+        index = gameFunctions.INDEX_OF.get(brd)
+        if index is not None and gameFunctions.ROOTS[index] == brd:
+            votes[index] = experience[brd]
+            known[index] = True
+    return votes, known
+
+def arraysToExperience(votes, known, experience):
+    """ Copies the known votes back into an experience list """
+    for index in np.flatnonzero(known):
+        experience[gameFunctions.ROOTS[index]] = int(votes[index])
+
+def boardCodes(boards):
+    """ Returns the base 3 code of every board """
+    return DIGIT[boards % 3] @ POW3
+
+def gameResults(boards):
+    """ Returns the result of every game: 0 (no result yet), 1 (X won), -1 (O won) or 2 (draw) """
+    lineSums = boards @ LINES.T
+    results = np.where((boards != 0).all(axis=1), 2, 0).astype(np.int8)
+    results[(lineSums == 3).any(axis=1)] = 1
+    results[(lineSums == -3).any(axis=1)] = -1
+    return results
+
+def randomMoves(boards, rng):
+    """ Returns a random empty (0) square for every board """
+    return np.where(boards == 0, rng.random(boards.shape), -1.0).argmax(axis=1)
+
+def bestMoves(boards, player, votes, known, rng):
+    """ Returns the square findBestMove would choose for every board ('player' is 1 for X, -1 for O) """
+    legal = boards == 0
+
+    #a move that completes a line wins straight away
+    lineSums = boards @ LINES.T
+    wins = ((lineSums[:, None, :] + player * LINES.T[None, :, :]) == 3 * player).any(axis=2) & legal
+
+    #otherwise one of the moves with the most votes (if any are above 0)
+    codes = boardCodes(boards)[:, None] + np.where(legal, DIGIT[player % 3] * POW3, 0)
+    indexes = CODE_INDEX[codes]
+    moveVotes = np.where(legal & known[indexes], votes[indexes], 0)
+    maxVotes = moveVotes.max(axis=1)
+    best = randomMoves(np.where(moveVotes == maxVotes[:, None], 0, 1), rng)
+
+    moves = randomMoves(boards, rng)
+    useVotes = maxVotes > 0
+    moves[useVotes] = best[useVotes]
+    useWins = wins.any(axis=1)
+    moves[useWins] = randomMoves(np.where(wins, 0, 1)[useWins], rng)
+    return moves
+
+def learnFromGames(history, results, xTable, oTable):
+    """ Adds the votes learnFromGame would give for each finished game
+        'history' holds the canonical index after each move (-1 for moves not made)
+    """
+    xVotes, xKnown = xTable
+    oVotes, oKnown = oTable
+    xMoves = history[:, 0::2]               #boards after X's moves
+    oMoves = history[:, 1::2]               #boards after O's moves
+
+    for winner, xVote, oVote in ((1, 2, -2), (-1, -2, 2)):
+        for moves, vote, votes, known in ((xMoves, xVote, xVotes, xKnown), (oMoves, oVote, oVotes, oKnown)):
+            indexes = moves[results == winner]
+            indexes = indexes[indexes >= 0]
+            np.add.at(votes, indexes, vote)
+            known[indexes] = True
+
+    #draws: X's moves are 'ok' if they weren't known, O's known moves are set to 'ok'
+    indexes = xMoves[results == 2]
+    indexes = indexes[indexes >= 0]
+    indexes = indexes[~xKnown[indexes]]
+    xVotes[indexes] = 1
+    xKnown[indexes] = True
+    indexes = oMoves[results == 2]
+    indexes = indexes[indexes >= 0]
+    indexes = indexes[oKnown[indexes]]
+    oVotes[indexes] = 1
+
+def playBatch(games, xPlayer, oPlayer, xTable, oTable, rng, learn=True):
+    """ Plays a batch of games in lockstep. Players are "self" (findBestMove rules) or "random"
+        Returns the array of results (see gameResults)
+    """
+    boards = np.zeros((games, 9), dtype=np.int8)
+    history = np.full((games, 9), -1, dtype=np.int16)
+    results = np.zeros(games, dtype=np.int8)
+    playing = np.arange(games)
+
+    for ply in range(9):
+        if ply % 2 == 0:
+            player, playerType, table = 1, xPlayer, xTable
+        else:
+            player, playerType, table = -1, oPlayer, oTable
+
+        current = boards[playing]
+        if playerType == "self":
+            moves = bestMoves(current, player, table[0], table[1], rng)
+        else:
+            moves = randomMoves(current, rng)
+        current[np.arange(len(playing)), moves] = player
+        boards[playing] = current
+        history[playing, ply] = CODE_INDEX[boardCodes(current)]
+
+        plyResults = gameResults(current)
+        finished = plyResults != 0
+        results[playing[finished]] = plyResults[finished]
+        if learn:
+            learnFromGames(history[playing[finished]], plyResults[finished], xTable, oTable)
+        playing = playing[~finished]
+        if len(playing) == 0:
+            break
+    return results
+
+def simulate(games, xPlayer="self", oPlayer="self", batchSize=10000, learn=True, seed=None):
+    """ Plays 'games' games in batches, using (and learning into) gameFunctions.X_Experience and O_Experience
+        Returns a dictionary of the number of 'X', 'O' and 'D' results
+    """
+    rng = np.random.default_rng(seed)
+    xTable = experienceToArrays(gameFunctions.X_Experience)
+    oTable = experienceToArrays(gameFunctions.O_Experience)
+    counts = np.zeros(4, dtype=np.int64)
+
+    played = 0
+    while played < games:
+        batch = min(batchSize, games - played)
+        results = playBatch(batch, xPlayer, oPlayer, xTable, oTable, rng, learn)
+        counts += np.bincount(results + 1, minlength=4)
+        played = played + batch
+
+    if learn:
+        arraysToExperience(xTable[0], xTable[1], gameFunctions.X_Experience)
+        arraysToExperience(oTable[0], oTable[1], gameFunctions.O_Experience)
+        gameFunctions.compilePolicy()
+        gameFunctions.gameCount = gameFunctions.gameCount + games
+    return {"O": int(counts[0]), "X": int(counts[2]), "D": int(counts[3])}
+
+def main():
+    parser = argparse.ArgumentParser(description="Play noughts and crosses games in big numpy batches")
+    parser.add_argument("--games", type=int, default=100000, help="number of games to play (default 100000)")
+    parser.add_argument("--batch-size", type=int, default=10000, help="games played at once (default 10000)")
+    parser.add_argument("--x", choices=("self", "random"), default="self", help="who plays X (default self)")
+    parser.add_argument("--o", choices=("self", "random"), default="self", help="who plays O (default self)")
+    parser.add_argument("--no-learn", action="store_true", help="only evaluate the experience, don't change it")
+    parser.add_argument("--experience", default="experience.txt", help="experience file to start from (default experience.txt)")
+    parser.add_argument("--output", help="file to save the experience to (default: the --experience file)")
+    parser.add_argument("--seed", type=int, help="random seed, for repeatable runs")
+    args = parser.parse_args()
+
+    gameFunctions.loadExperience(args.experience)
+
+    print("Playing", args.games, "games:", args.x, "(X) v", args.o, "(O) in batches of", args.batch_size)
+    startTime = time.perf_counter()
+    results = simulate(args.games, args.x, args.o, args.batch_size, not args.no_learn, args.seed)
+    elapsed = time.perf_counter() - startTime
+
+    print("X wins:", results["X"], " O wins:", results["O"], " Draws:", results["D"])
+    print("%d games in %.2f s (%.0f games per second)" % (args.games, elapsed, args.games / max(elapsed, 1e-9)))
+
+    if not args.no_learn:
+        print("Game Count = ", gameFunctions.gameCount)
+        gameFunctions.saveExperience(args.output or args.experience)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+#
+#   Noughts and Crosses Benchmarks
+#   ==============================
+#
+#   Times the game engine (gameFunctions.py) so changes to it can be judged on
+#   numbers. Results are saved as JSON, and can be compared with an earlier run
+#   (the "baseline") to flag anything that got slower or worse.
+#
+#   eg:  python3 benchmark.py --output baseline.json
+#        python3 benchmark.py --output new.json --compare baseline.json
+#        python3 benchmark.py --micro-only --compare baseline.json --threshold 20
+#
+#   Micro benchmarks (time per call) use realistic inputs: every position a
+#   real game can reach, the shipped experience296.txt, and games played by the
+#   computer from it. Like timeit, each one is looped until a run takes at least
+#   MIN_TIME, and the median of REPEAT runs is kept; how much the runs differ
+#   (their range, as a percentage of the median) is saved as its "noise".
+#
+#   Macro benchmarks:
+#       selfPlay games/s      - self v self games (findBestMove + learnFromGame), from experience296.txt
+#       batch games/s         - the same with batchSimulator.py (only if numpy is installed)
+#       games to convergence  - self v self games from no experience until the learnt moves
+#                               stop changing (see convergence below), averaged over a few seeds
+#       converged accuracy    - how often the learnt moves are as good as perfect play at that point
+#
+#   Drawing benchmarks (--emulator, needs pyserial):
+#       goHome s, drawBoard s, ...  - seconds for each drawing on an emulated uArm (uArmEmulator.py),
+#                                     averaged over every square and win line
+#       arm busy fraction           - how much of that time the arm was moving (the rest is
+#                                     waiting on the serial protocol)
+#
+#   Every result has a "better" direction (lower for times, higher for speeds),
+#   and a result more than --threshold percent worse than the baseline is a
+#   regression (the exit status is 1 if there are any). For a micro benchmark
+#   the threshold is raised to the noise of the two runs added together, so a
+#   timing that just wobbles isn't reported.
+
+import argparse     #for the command line options
+import collections  #gamelist needs to be an ordered dictionary
+import contextlib   #for hiding the engine's "loading experience" messages
+import io           #somewhere to send those messages
+import json         #for the results files
+import os           #for the temporary experience files
+import platform     #to record what the benchmarks ran on
+import random       #for repeatable games
+import sys          #for the exit status
+import tempfile     #for the temporary experience files
+import time         #for timing everything
+import drawingFunctions  #the drawings to time on the emulated uArm
+import gameFunctions     #library of game rules and learning (the game engine)
+import selfPlay     #for the self-play games
+
+try:
+    import batchSimulator   #needs numpy
+except ImportError:
+    batchSimulator = None
+
+try:
+    import uArmEmulator     #needs a pseudo-terminal (Linux, macOS)
+    import uArmFunctions    #needs pyserial
+except ImportError:
+    uArmEmulator = None
+
+EXPERIENCE_FILE = "experience296.txt"
+REPEAT = 7                  #each micro benchmark is run this many times and the median time kept
+MIN_TIME = 0.2              #seconds each run of a micro benchmark takes at least (it is looped until it does)
+CONVERGENCE_CHECK = 50      #games between convergence checks
+CONVERGENCE_CHECKS = 10     #the learnt moves must be unchanged for this many checks in a row
+CONVERGENCE_LIMIT = 20000   #give up after this many games
+CONVERGENCE_SEEDS = (0, 1, 2)
+
+def quietly(func, *args):
+    """ Calls func(*args) with anything it prints thrown away """
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+Timing = collections.namedtuple("Timing", "value noise")   #a micro benchmark: microseconds per call, noise (percent)
+
+def medianTiming(times):
+    """ Returns the Timing of a list of runs: the median, and the range of the runs as a percentage of it """
+    times = sorted(times)
+    middle = len(times) // 2
+    median = times[middle] if len(times) % 2 else (times[middle - 1] + times[middle]) / 2
+    return Timing(median, (times[-1] - times[0]) / median * 100 if median else 0.0)
+
+def timePerCall(func, inputs, repeat=REPEAT):
+    """ Returns the Timing (in microseconds) per call of func over all the inputs: every input is
+        called enough times over for each run to take at least MIN_TIME, and the median run kept
+    """
+    def run(loops):
+        startTime = time.perf_counter()
+        for l in range(loops):
+            for i in inputs:
+                func(i)
+        return time.perf_counter() - startTime
+
+    scale = 1
+    loops = None
+    while loops is None:                        #the same steps as timeit's autorange: 1, 2, 5, 10, 20, 50, ...
+        for step in (1, 2, 5):
+            if run(scale * step) >= MIN_TIME:
+                loops = scale * step
+                break
+        scale = scale * 10
+    calls = loops * len(inputs)
+    return medianTiming([run(loops) / calls * 1e6 for r in range(repeat)])
+
+def recordGames(count):
+    """ Returns 'count' games (ordered dictionaries of root boards, as learnFromGame expects)
+        played by the computer (findBestMove, as X) against random moves
+    """
+    games = []
+    for n in range(count):
+        board = gameFunctions.EMPTY_BOARD
+        GameList = collections.OrderedDict()
+        while True:
+            if gameFunctions.nextPlayer(board) == "X":
+                board = gameFunctions.findBestMove(board)
+            else:
+                board = selfPlay.randomMove(board)
+            GameList[gameFunctions.rootBoard(board)] = 0
+            if gameFunctions.checkWin(board)[0] != "N":
+                break
+        games.append(GameList)
+    return games
+
+def microBenchmarks(experienceFile):
+    """ Returns {name: Timing (microseconds per call)} for the engine functions """
+    results = {}
+    positions = list(gameFunctions.INDEX_OF)                                    #all 5478 reachable positions
+    playing = [brd for brd in positions if gameFunctions.isGameWon(brd) == "N" and gameFunctions.nextMoves(brd)]
+
+    results["isGameWon"] = timePerCall(gameFunctions.isGameWon, positions)
+    results["checkWin"] = timePerCall(gameFunctions.checkWin, positions)
+    results["nextMoves"] = timePerCall(gameFunctions.nextMoves, playing)
+    results["rootBoard"] = timePerCall(gameFunctions.rootBoard, positions)
+    results["calcRootBoard"] = timePerCall(gameFunctions.calcRootBoard, positions)
+    results["tfRotate"] = timePerCall(gameFunctions.tfRotate, positions)
+    results["tfFlip"] = timePerCall(gameFunctions.tfFlip, positions)
+
+    quietly(gameFunctions.loadExperience, experienceFile)
+    results["findBestMove"] = timePerCall(gameFunctions.findBestMove, playing)
+    results["searchBestMove"] = timePerCall(gameFunctions.searchBestMove, playing)
+
+    #learnFromGame changes the experience, so it can't be looped: each run is all the games,
+    #from a fresh copy of the experience
+    games = recordGames(500)
+    times = []
+    for r in range(REPEAT):
+        quietly(gameFunctions.loadExperience, experienceFile)
+        startTime = time.perf_counter()
+        for game in games:
+            gameFunctions.learnFromGame(game)
+        times.append((time.perf_counter() - startTime) / len(games) * 1e6)
+    results["learnFromGame"] = medianTiming(times)
+
+    with tempfile.TemporaryDirectory() as tempDir:
+        textFile = os.path.join(tempDir, "experience.txt")
+        binaryFile = os.path.join(tempDir, "experience.bin")
+        quietly(gameFunctions.loadExperience, experienceFile)
+        results["saveExperience"] = timePerCall(lambda f: quietly(gameFunctions.saveExperience, f), [textFile])
+        results["saveExperienceBinary"] = timePerCall(lambda f: quietly(gameFunctions.saveExperienceBinary, f), [binaryFile])
+        results["loadExperience"] = timePerCall(lambda f: quietly(gameFunctions.loadExperience, f), [textFile])
+        results["loadExperience (binary)"] = timePerCall(lambda f: quietly(gameFunctions.loadExperience, f), [binaryFile])
+    return results
+
+def selfPlayRate(experienceFile, games=5000):
+    """ Returns the self v self games per second with findBestMove and learnFromGame """
+    quietly(gameFunctions.loadExperience, experienceFile)
+    startTime = time.perf_counter()
+    selfPlay.selfPlay(games, gameFunctions.findBestMove, gameFunctions.findBestMove)
+    return games / (time.perf_counter() - startTime)
+
+def batchRate(experienceFile, games=100000):
+    """ Returns the self v self games per second with batchSimulator """
+    quietly(gameFunctions.loadExperience, experienceFile)
+    startTime = time.perf_counter()
+    batchSimulator.simulate(games, seed=0)
+    return games / (time.perf_counter() - startTime)
+
+def policyAccuracy():
+    """ Returns how often (on average over every root board with a move to make) the move
+        findBestMove would make is as good as perfect play
+    """
+    total = 0.0
+    boards = 0
+    for index, root in enumerate(gameFunctions.ROOTS):
+        moves = dict(gameFunctions.MOVES_OF[index])
+        if not moves:
+            continue
+        player = gameFunctions.nextPlayer(root)
+        results = {square: selfPlay.perfectResult(child) for square, child in moves.items()}
+        if player in results.values():
+            best = player
+        elif "D" in results.values():
+            best = "D"
+        else:
+            best = None                                         #every move loses
+        squares = gameFunctions.WINNING_SQUARES[index] or gameFunctions.POLICY_MOVES[index] or tuple(moves)
+        total = total + sum(1 for square in squares if best is None or results[square] == best) / len(squares)
+        boards = boards + 1
+    return total / boards
+
+def convergence(seed):
+    """ Plays self v self games from no experience until the learnt moves stop changing
+        (the same policy accuracy for CONVERGENCE_CHECKS checks in a row)
+        Returns (games played before it stopped changing, policy accuracy)
+    """
+    random.seed(seed)
+    gameFunctions.X_Experience = gameFunctions.ExperienceStore()
+    gameFunctions.O_Experience = gameFunctions.ExperienceStore()
+    gameFunctions.compilePolicy()
+
+    accuracy = policyAccuracy()
+    converged = 0
+    unchanged = 0
+    played = 0
+    while played < CONVERGENCE_LIMIT and unchanged < CONVERGENCE_CHECKS:
+        selfPlay.selfPlay(CONVERGENCE_CHECK, gameFunctions.findBestMove, gameFunctions.findBestMove)
+        played = played + CONVERGENCE_CHECK
+        newAccuracy = policyAccuracy()
+        if abs(newAccuracy - accuracy) < 1e-9:
+            unchanged = unchanged + 1
+        else:
+            accuracy = newAccuracy
+            converged = played
+            unchanged = 0
+    return converged, accuracy
+
+def macroBenchmarks(experienceFile):
+    """ Returns {name: value} for the end-to-end benchmarks """
+    results = {}
+    results["selfPlay games/s"] = selfPlayRate(experienceFile)
+    if batchSimulator is not None:
+        results["batch games/s"] = batchRate(experienceFile)
+
+    runs = [convergence(seed) for seed in CONVERGENCE_SEEDS]
+    results["games to convergence"] = sum(games for games, accuracy in runs) / len(runs)
+    results["converged accuracy"] = sum(accuracy for games, accuracy in runs) / len(runs)
+    return results
+
+def drawingBenchmarks():
+    """ Returns {name: value} for drawing on an emulated uArm """
+    emulator = uArmEmulator.UArmEmulator()
+    uArm = quietly(uArmFunctions.openUArm, emulator.start())
+    drawings = [
+        ("goHome", uArmFunctions.goHome, [()]),
+        ("drawBoard", uArmFunctions.drawBoard, [()]),
+        ("drawNought", uArmFunctions.drawNought, [(square,) for square in range(9)]),
+        ("drawCross", uArmFunctions.drawCross, [(square,) for square in range(9)]),
+        ("drawWinLine", uArmFunctions.drawWinLine, [(winLine,) for winLine in drawingFunctions.WIN_LINES]),
+        ("goVision", uArmFunctions.goVision, [()]),
+    ]
+    results = {}
+    total = 0.0
+    for name, func, calls in drawings:
+        startTime = time.perf_counter()
+        for args in calls:
+            quietly(func, uArm, *args)
+        elapsed = time.perf_counter() - startTime
+        results[name + " s"] = elapsed / len(calls)
+        total = total + elapsed
+    results["arm busy fraction"] = emulator.motionTime() / total
+    uArmFunctions.closeUArm(uArm)
+    emulator.stop()
+    return results
+
+#unit and which way is better for each kind of result
+UNITS = {
+    "selfPlay games/s": ("games/s", "higher"),
+    "batch games/s": ("games/s", "higher"),
+    "games to convergence": ("games", "lower"),
+    "converged accuracy": ("fraction", "higher"),
+    "arm busy fraction": ("fraction", "higher"),
+}
+
+def runBenchmarks(experienceFile, macro=True, seed=0, drawing=False):
+    """ Runs the benchmarks and returns the results as a dictionary ready to save as JSON """
+    random.seed(seed)
+    values = microBenchmarks(experienceFile)
+    if macro:
+        values.update(macroBenchmarks(experienceFile))
+    if drawing:
+        values.update(drawingBenchmarks())
+
+    results = {}
+    for name, value in values.items():
+        unit, better = UNITS.get(name, ("s" if name.endswith(" s") else "us", "lower"))
+        results[name] = {"value": value, "unit": unit, "better": better}
+        if isinstance(value, Timing):
+            results[name].update(value=value.value, noise=value.noise)
+    return {
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "experience": experienceFile,
+        "results": results,
+    }
+
+def compareResults(results, baseline, threshold):
+    """ Prints each result against the baseline, returns the names of the regressions
+        (results more than 'threshold' percent worse than the baseline, or than the noise
+        of the two runs added together if that is more)
+    """
+    regressions = []
+    print("%-26s %14s %14s %9s %7s" % ("benchmark", "baseline", "now", "change", "noise"))
+    for name, result in results["results"].items():
+        old = baseline["results"].get(name)
+        if old is None or not old["value"]:
+            print("%-26s %14s %14.4g %9s" % (name, "-", result["value"], "new"))
+            continue
+        change = (result["value"] - old["value"]) / old["value"] * 100
+        worse = change if result["better"] == "lower" else -change
+        noise = result.get("noise", 0.0) + old.get("noise", 0.0)
+        flag = ""
+        if worse > max(threshold, noise):
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print("%-26s %14.4g %14.4g %+8.1f%% %6.1f%%%s" % (name, old["value"], result["value"], change, noise, flag))
+    return regressions
+
+def printResults(results):
+    for name, result in results["results"].items():
+        print("%-26s %14.4g %s" % (name, result["value"], result["unit"]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the noughts and crosses game engine")
+    parser.add_argument("--experience", default=EXPERIENCE_FILE, help="experience file to use (default " + EXPERIENCE_FILE + ")")
+    parser.add_argument("--output", help="file to save the results to (JSON)")
+    parser.add_argument("--compare", help="baseline results file (JSON) to compare with")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent worse than the baseline that counts as a regression, at least (default 10, or the runs' noise if more)")
+    parser.add_argument("--micro-only", action="store_true", help="skip the end-to-end benchmarks")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default 0)")
+    parser.add_argument("--emulator", action="store_true", help="also time the drawings on an emulated uArm (needs pyserial)")
+    args = parser.parse_args()
+
+    if args.emulator and uArmEmulator is None:
+        parser.error("--emulator needs pyserial")
+    results = runBenchmarks(args.experience, not args.micro_only, args.seed, args.emulator)
+
+    if args.output:
+        with open(args.output, "w") as resultsFile:
+            json.dump(results, resultsFile, indent=2)
+            resultsFile.write("\n")
+
+    if args.compare:
+        with open(args.compare, "r") as baselineFile:
+            baseline = json.load(baselineFile)
+        regressions = compareResults(results, baseline, args.threshold)
+        if regressions:
+            print(len(regressions), "regression(s):", ", ".join(regressions))
+            sys.exit(1)
+        print("No regressions")
+    else:
+        printResults(results)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,13 @@
 import cv2             #opencv library
 import numpy as np     #opencv library support
 import time            #for time delays
+import traceFunctions  #for timing the webcam
 
 """%%%%%%%%%%%%%%%% COMPUTER VISION FUNCTIONS %%%%%%%%%%%%%%%%"""
 '''Cycles through 10 frames of the video to flush out the older frames such that the live frames are being shown
 without this function the frames from the last video.read() are initially shown.
 I assume the buffer for the webcam isn't always up to date'''
+@traceFunctions.traced()
 def refreshWebcam(video):
     count_vid = 0
     # refresh the video stream
@@ -15,8 +17,25 @@ def refreshWebcam(video):
         cv2.waitKey(10)
         count_vid = count_vid + 1
     
+'''Waits until the camera has stopped moving (eg: the robot arm has just put it in place) by reading frames until
+one is nearly the same as the frame before it, and returns that frame. Gives up after time_out seconds and returns
+the latest frame, so a busy scene (eg: a hand over the board) can't hold the game up for long.'''
+STEADY_DIFFERENCE = 2.0     #average difference (0-255) between the pixels of two frames for the camera to be steady
+@traceFunctions.traced()
+def waitForSteadyCamera(video, time_out=2):
+    _, frame = video.read()
+    previous_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    give_up = time.time() + time_out
+    while True:
+        _, frame = video.read()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if np.mean(cv2.absdiff(gray, previous_gray)) < STEADY_DIFFERENCE or time.time() > give_up:
+            return frame
+        previous_gray = gray
+    
 '''function that takes in the video variable (e.g. cap) and returns whether the player has drawn anything (True or False).
 Also returns the row and column of the players move if they drew on the board.'''
+@traceFunctions.traced()
 def checkPlayerMove(video, board_lines, original_image):
 
     #get snapshot of gameboard before the player makes their move
@@ -215,6 +234,7 @@ blob_params.filterByInertia = True
 blob_params.minInertiaRatio = 0.01
 
 '''uses edge detection and morphology to detect the gameboard'''
+@traceFunctions.traced()
 def detect_gameboard(video_frame):
 
     input_img_gray = cv2.cvtColor(video_frame, cv2.COLOR_BGR2GRAY)
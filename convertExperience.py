@@ -0,0 +1,34 @@
+#
+#   Noughts and Crosses Experience Converter
+#   ========================================
+#
+#   Converts experience files between the experience.txt text format and the
+#   binary format (see gameFunctions.py). The input format is recognised
+#   automatically; the output is binary if its name ends in ".bin", otherwise text.
+#
+#   eg:  python3 convertExperience.py experience296.txt experience296.bin
+#        python3 convertExperience.py experience.bin experience.txt
+
+import argparse     #for the command line options
+import gameFunctions     #library of game rules and learning (the game engine)
+
+def convertExperience(inFile, outFile):
+    """ Loads any experience file and saves it in the format given by the output file name """
+    gameFunctions.loadExperience(inFile)
+    if outFile.endswith(".bin"):
+        gameFunctions.saveExperienceBinary(outFile)
+    else:
+        gameFunctions.saveExperience(outFile)
+    print("Converted", len(gameFunctions.X_Experience), "X boards and", len(gameFunctions.O_Experience),
+          "O boards from", inFile, "to", outFile)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert noughts and crosses experience files between text and binary")
+    parser.add_argument("input", help="experience file to read (text or binary)")
+    parser.add_argument("output", help="experience file to write (binary if it ends in .bin, otherwise text)")
+    args = parser.parse_args()
+
+    convertExperience(args.input, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#
+#   uArm Drawing Geometry and Stroke Planner
+#   ========================================
+#
+#   Everything the robot draws (the grid, noughts, crosses and win lines) is
+#   described here as "strokes", drawn with the pen down: a starting (x, y)
+#   point in the uArm's coordinates (mm), then each point the pen goes to in a
+#   straight line, or an Arc (to a point, around a centre). The board is laid
+#   out as (with the standard geometry):
+#
+#         y=0    y=25   y=50   y=75
+#       x=150 +------+------+------+
+#             |  0   |  1   |  2   |
+#       x=175 +------+------+------+
+#             |  3   |  4   |  5   |
+#       x=200 +------+------+------+
+#             |  6   |  7   |  8   |
+#       x=225 +------+------+------+
+#
+#   The board's position and size, the pen heights and the feed rates are all
+#   in 'geometry' (change them with setGeometry, or loadGeometry from a JSON file).
+#
+#   planStrokes puts the strokes in a good order before they are drawn: it
+#   always draws next whichever stroke starts (or ends, drawing it backwards)
+#   nearest to where the pen is, joins strokes that carry on from each other
+#   without lifting the pen, and drops points in the middle of straight lines.
+#   strokesGCode turns the plan into g-code (absolute moves only): G0 at the
+#   travel feed rate with the pen up, G1 (straight lines) and G2/G3 (arcs,
+#   clockwise/anticlockwise) at the drawing feed rate with the pen down. A feed
+#   rate is only given (F) when it changes.
+#
+#   Every drawing the game needs (the board, a nought or cross in each square,
+#   each win line) is compiled once into a Program: its g-code, already
+#   numbered and encoded as the bytes to write to the uArm, so drawing one is
+#   just writing those bytes as the stream's window allows (see
+#   uArmFunctions.GCodeStream.sendProgram). Changing the geometry compiles them
+#   all again.
+
+import collections  #for the geometry and program tuples
+import json         #for geometry files
+import math         #for distances
+
+Geometry = collections.namedtuple("Geometry", "boardX boardY cell penDownZ penUpZ home travelFeed drawFeed")
+
+geometry = Geometry(
+    boardX=150,         #corner of the board (mm)
+    boardY=0,
+    cell=25,            #size of each square (mm)
+    penDownZ=0,         #pen height when drawing
+    penUpZ=10,          #pen height when moving between strokes
+    home=(150, 0),      #where the pen is assumed to start
+    travelFeed=20000,   #feed rate with the pen up (mm/min, the uArm's fastest)
+    drawFeed=20000,     #feed rate with the pen down (mm/min, as fast as the pen has always drawn: lower it if lines are ragged)
+)
+
+#nought (a circle) and cross, as fractions of a square
+NOUGHT_RADIUS = 0.3
+CROSS_SHAPE = [[(0.2, 0.2), (0.8, 0.8)], [(0.2, 0.8), (0.8, 0.2)]]
+
+Arc = collections.namedtuple("Arc", "end centre clockwise")     #a piece of a stroke: an arc to 'end' around 'centre'
+
+def point(x, y):
+    """ Returns an (x, y) point, rounded so equal points compare equal """
+    return (round(x, 3), round(y, 3))
+
+def squareCorner(whichSquare):
+    """ Returns the (x, y) corner of a square (the corner nearest the board's corner) """
+    return geometry.boardX + (whichSquare // 3) * geometry.cell, geometry.boardY + (whichSquare % 3) * geometry.cell
+
+def squareCentre(whichSquare):
+    x, y = squareCorner(whichSquare)
+    return x + geometry.cell / 2, y + geometry.cell / 2
+
+def endOf(piece):
+    """ Returns where a piece of a stroke (a point or an Arc) ends """
+    return piece.end if isinstance(piece, Arc) else piece
+
+# ==========
+# GEOMETRY
+# ==========
+
+def gridStrokes():
+    """ Returns the strokes for the four lines of the grid """
+    x, y, cell = geometry.boardX, geometry.boardY, geometry.cell
+    strokes = []
+    for n in (1, 2):
+        strokes.append([point(x, y + n * cell), point(x + 3 * cell, y + n * cell)])
+        strokes.append([point(x + n * cell, y), point(x + n * cell, y + 3 * cell)])
+    return strokes
+
+def noughtStrokes(whichSquare):
+    """ Returns the stroke for a nought: a circle, as two half circles """
+    x, y = squareCentre(whichSquare)
+    radius = NOUGHT_RADIUS * geometry.cell
+    centre = point(x, y)
+    start = point(x - radius, y)
+    return [[start, Arc(point(x + radius, y), centre, True), Arc(start, centre, True)]]
+
+def crossStrokes(whichSquare):
+    x, y = squareCorner(whichSquare)
+    return [[point(x + dx * geometry.cell, y + dy * geometry.cell) for dx, dy in line] for line in CROSS_SHAPE]
+
+def winLineStrokes(winLine):
+    """ Returns the stroke through a winning line (eg: "012"), from edge to edge of the board, or [] for no line """
+    if len(winLine) != 3:
+        return []
+    x1, y1 = squareCentre(int(winLine[0]))
+    x2, y2 = squareCentre(int(winLine[2]))
+    dx = (x2 - x1) / 4                          #half a square further on at each end
+    dy = (y2 - y1) / 4
+    return [[point(x1 - dx, y1 - dy), point(x2 + dx, y2 + dy)]]
+
+# =========
+# PLANNER
+# =========
+
+def distance(p, q):
+    return math.hypot(p[0] - q[0], p[1] - q[1])
+
+def straighten(stroke):
+    """ Returns the stroke without any points in the middle of a straight line (or repeated) """
+    pieces = [stroke[0]]
+    for p in stroke[1:]:
+        if isinstance(p, Arc):
+            pieces.append(p)
+            continue
+        if p == endOf(pieces[-1]):
+            continue
+        if len(pieces) >= 2 and not isinstance(pieces[-1], Arc):
+            (ax, ay), (bx, by) = endOf(pieces[-2]), pieces[-1]
+            if abs((bx - ax) * (p[1] - by) - (by - ay) * (p[0] - bx)) < 1e-9 and (bx - ax) * (p[0] - bx) + (by - ay) * (p[1] - by) > 0:
+                pieces[-1] = p                  #carries straight on
+                continue
+        pieces.append(p)
+    return pieces
+
+def reverseStroke(stroke):
+    """ Returns the stroke drawn the other way round (its arcs turn the other way) """
+    points = [endOf(piece) for piece in stroke]
+    backwards = [points[-1]]
+    for i in range(len(stroke) - 1, 0, -1):
+        if isinstance(stroke[i], Arc):
+            backwards.append(Arc(points[i - 1], stroke[i].centre, not stroke[i].clockwise))
+        else:
+            backwards.append(points[i - 1])
+    return backwards
+
+def startingPoints(stroke):
+    """ Returns every way the stroke can be drawn: forwards and backwards, and from any point if it's closed """
+    if len(stroke) > 2 and stroke[0] == endOf(stroke[-1]):
+        pieces = stroke[1:]
+        ways = []
+        for i in range(len(pieces)):
+            turned = [endOf(pieces[i - 1])] + pieces[i:] + pieces[:i]
+            ways.append(turned)
+            ways.append(reverseStroke(turned))
+        return ways
+    return [stroke, reverseStroke(stroke)]
+
+def planStrokes(strokes, start=None):
+    """ Returns the strokes in drawing order, each one drawn whichever way round starts nearest the pen,
+        with strokes that carry on from each other joined into one
+    """
+    remaining = [straighten(stroke) for stroke in strokes if len(stroke) >= 2]
+    plan = []
+    position = start or geometry.home
+    while remaining:
+        best = None
+        for i, stroke in enumerate(remaining):
+            for way in startingPoints(stroke):
+                gap = distance(position, way[0])
+                if best is None or gap < best[0]:
+                    best = (gap, i, way)
+        gap, i, way = best
+        remaining.pop(i)
+        if plan and endOf(plan[-1][-1]) == way[0]:
+            plan[-1] = straighten(plan[-1] + way[1:])     #carries on from the last stroke, no need to lift the pen
+        else:
+            plan.append(way)
+        position = endOf(way[-1])
+    return plan
+
+def penUpDistance(plan, start=None):
+    """ Returns how far the pen travels between strokes (mm) """
+    total = 0.0
+    position = start or geometry.home
+    for stroke in plan:
+        total = total + distance(position, stroke[0])
+        position = endOf(stroke[-1])
+    return total
+
+def number(value):
+    """ Returns a coordinate as g-code wants it (eg: 150 or 162.5) """
+    return "%g" % value
+
+def strokesGCode(strokes, start=None):
+    """ Returns the g-code that draws the strokes (planned by planStrokes), finishing with the pen up """
+    gCode = []
+    feed = None
+
+    def move(command, words, newFeed):
+        nonlocal feed
+        if newFeed != feed:
+            words = words + " F" + number(newFeed)
+            feed = newFeed
+        gCode.append(command + " " + words)
+
+    for stroke in planStrokes(strokes, start):
+        move("G0", "Z" + number(geometry.penUpZ), geometry.travelFeed)
+        move("G0", "X" + number(stroke[0][0]) + " Y" + number(stroke[0][1]), geometry.travelFeed)
+        move("G1", "Z" + number(geometry.penDownZ), geometry.drawFeed)
+        position = stroke[0]
+        for piece in stroke[1:]:
+            x, y = endOf(piece)
+            if isinstance(piece, Arc):
+                move("G2" if piece.clockwise else "G3", "X" + number(x) + " Y" + number(y) +
+                     " I" + number(round(piece.centre[0] - position[0], 3)) + " J" + number(round(piece.centre[1] - position[1], 3)), geometry.drawFeed)
+            else:
+                move("G1", "X" + number(x) + " Y" + number(y), geometry.drawFeed)
+            position = (x, y)
+    if gCode:
+        move("G0", "Z" + number(geometry.penUpZ), geometry.travelFeed)
+    return gCode
+
+# ==========
+# PROGRAMS
+# ==========
+#
+#   A Program's commands are numbered from PROGRAM_NUMBER + 1, a range the
+#   numbered commands sent one at a time never reach, so their replies can be
+#   matched by number as usual. A uArm only has one program running at a time.
+
+Program = collections.namedtuple("Program", "name gCodes numbers lines")
+
+PROGRAM_NUMBER = 10000
+
+def compileProgram(name, gCodes):
+    """ Returns a Program: the g-code numbered, and each command encoded ready to write to the uArm """
+    numbers = tuple(range(PROGRAM_NUMBER + 1, PROGRAM_NUMBER + 1 + len(gCodes)))
+    lines = tuple(("#" + str(n) + " " + gCode + "\n").encode("utf-8") for n, gCode in zip(numbers, gCodes))
+    return Program(name, tuple(gCodes), numbers, lines)
+
+programs = {}       #("board", None), ("O", square), ("X", square) or ("line", winLine) -> Program
+
+WIN_LINES = ("012", "345", "678", "036", "147", "258", "048", "246")
+
+def compilePrograms():
+    """ Compiles every drawing the game needs, for the current geometry """
+    programs.clear()
+    programs["board", None] = compileProgram("board", strokesGCode(gridStrokes()))
+    for square in range(9):
+        programs["O", square] = compileProgram("nought " + str(square), strokesGCode(noughtStrokes(square)))
+        programs["X", square] = compileProgram("cross " + str(square), strokesGCode(crossStrokes(square)))
+    for winLine in WIN_LINES:
+        programs["line", winLine] = compileProgram("line " + winLine, strokesGCode(winLineStrokes(winLine)))
+
+def setGeometry(**changes):
+    """ Changes the board geometry (eg: setGeometry(boardX=160, cell=30)) and compiles the programs again """
+    global geometry
+    geometry = geometry._replace(**changes)
+    compilePrograms()
+
+def loadGeometry(fileName="board.json"):
+    """ Loads the board geometry from a JSON file of any of the Geometry fields, eg: {"boardX": 160, "cell": 30} """
+    with open(fileName, "r") as geometryFile:
+        changes = json.load(geometryFile)
+    if "home" in changes:
+        changes["home"] = tuple(changes["home"])
+    setGeometry(**changes)
+
+compilePrograms()
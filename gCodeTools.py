@@ -0,0 +1,197 @@
+#
+#   uArm G-code Tools
+#   =================
+#
+#   Replays g-code traces (recorded by uArmFunctions, see TRACE_FILE) and
+#   estimates how long g-code should take, without spending robot time:
+#
+#       python3 gCodeTools.py estimate                      - every drawing the game makes
+#       python3 gCodeTools.py estimate gcode.trace          - a trace, against how long it really took
+#       python3 gCodeTools.py estimate drawing.gcode        - a file of g-code, one command a line
+#       python3 gCodeTools.py replay gcode.trace /dev/ttyACM0 [--timing]
+#
+#   The estimate runs the g-code through the emulator's model of the arm
+#   (uArmEmulator.ArmModel): how far each move goes, how fast (the feed rate,
+#   speeding up and slowing down), and a little time to read each command. That
+#   is how long the arm takes when the commands are streamed (as the drawings
+#   are); sendGCode, which waits for each reply before sending the next command,
+#   also pays a serial round trip for every command.
+#
+#   A replay sends the commands recorded for one port of the trace (the first
+#   one, or --from PORT) to a uArm or the emulator, streamed, or with --timing
+#   at the times they were first sent.
+
+import argparse     #for the command line options
+import json         #the trace is JSON lines
+import time         #for timing the replay
+import drawingFunctions  #the drawings to estimate
+import uArmEmulator      #the model of the arm, for the estimates
+
+def loadTrace(fileName):
+    """ Returns the entries of a g-code trace (dictionaries, see uArmFunctions.TRACE_FILE) """
+    with open(fileName, "r") as traceFile:
+        return [json.loads(line) for line in traceFile if line.strip()]
+
+def loadGCode(fileName):
+    """ Returns the commands in a g-code file (one a line, ';' starts a comment) """
+    with open(fileName, "r") as gCodeFile:
+        lines = [line.split(";")[0].strip() for line in gCodeFile]
+    return [line for line in lines if line]
+
+def isTrace(fileName):
+    with open(fileName, "r") as traceFile:
+        for line in traceFile:
+            if line.strip():
+                return line.lstrip().startswith("{")
+    return False
+
+def portEntries(entries, port=None):
+    """ Returns (port, its entries) for one port of a trace (the first port in it, if port is None) """
+    if port is None:
+        port = next((entry.get("port") for entry in entries), None)
+    return port, [entry for entry in entries if entry.get("port") == port]
+
+def commandTimes(entries):
+    """ Returns [(line sent, time sent, time of its reply or None)] for one port's entries
+        (numbered commands are matched to their replies by number, the others in order)
+    """
+    commands = []
+    waiting = {}                #command number -> index in commands
+    unnumbered = []             #indexes in commands, oldest first
+    for entry in entries:
+        if "sent" in entry:
+            number, gCode = uArmEmulator.splitNumber(entry["sent"])
+            if number is None:
+                unnumbered.append(len(commands))
+            else:
+                waiting[number] = len(commands)
+            commands.append([entry["sent"], entry["time"], None])
+        elif "received" in entry:
+            reply = entry["received"].split()
+            if not reply or reply[0][:1] == "@":
+                continue                                #an event, not a reply
+            if reply[0][:1] == "$" and reply[0][1:].isdigit():
+                index = waiting.pop(int(reply[0][1:]), None)
+            else:
+                index = unnumbered.pop(0) if unnumbered else None
+            if index is not None:
+                commands[index][2] = entry["time"]
+    return [tuple(command) for command in commands]
+
+# ==========
+# ESTIMATE
+# ==========
+
+def startPosition():
+    """ Where the pen starts a drawing: home, with the pen up """
+    x, y = drawingFunctions.geometry.home
+    return (float(x), float(y), float(drawingFunctions.geometry.penUpZ))
+
+def estimateDrawings(kinematics):
+    """ Prints the estimated time of every compiled drawing (drawingFunctions.programs) """
+    print("%-12s %8s %8s %10s %10s" % ("drawing", "commands", "ink mm", "travel mm", "estimate s"))
+    total = 0.0
+    for program in drawingFunctions.programs.values():
+        seconds, model = uArmEmulator.estimateTime(program.gCodes, kinematics, startPosition())
+        total = total + seconds
+        print("%-12s %8d %8.1f %10.1f %10.3f" % (program.name, len(program.gCodes), model.inkLength(), model.travelLength(), seconds))
+    print("%-12s %8s %8s %10s %10.3f" % ("all", "", "", "", total))
+
+def estimateGCode(gCodes, kinematics):
+    seconds, model = uArmEmulator.estimateTime(gCodes, kinematics)
+    print(len(gCodes), "commands, %.1f mm drawn, %.1f mm travel: estimate %.3f s" % (model.inkLength(), model.travelLength(), seconds))
+
+def estimateTrace(entries, kinematics, port=None, top=5):
+    """ Prints how long one port of a trace took against the estimate, and its slowest commands """
+    port, entries = portEntries(entries, port)
+    commands = commandTimes(entries)
+    if not commands:
+        print("No commands sent to", port)
+        return
+    model = uArmEmulator.ArmModel(kinematics)
+    estimates = []
+    for line, sent, replied in commands:
+        before = model.busyUntil
+        model.perform(uArmEmulator.splitNumber(line)[1])
+        estimates.append(model.busyUntil - before)
+
+    replies = [replied for line, sent, replied in commands if replied is not None]
+    took = (max(replies) if replies else commands[-1][1]) - commands[0][1]
+    print(port + ":", len(commands), "commands,", len(commands) - len(replies), "without a reply")
+    print("    took %.3f s, estimate %.3f s (%.1f mm drawn, %.1f mm travel)" % (took, model.busyUntil + kinematics.latency, model.inkLength(), model.travelLength()))
+
+    #how long the arm spent on each command: from when it was sent, or the reply before it if that was later
+    spent = []
+    previous = commands[0][1]
+    for (line, sent, replied), estimate in zip(commands, estimates):
+        if replied is not None:
+            spent.append((replied - max(sent, previous), estimate, line))
+            previous = replied
+    spent.sort(reverse=True)
+    if spent and top:
+        print("    slowest commands:         took s  estimate s")
+        for seconds, estimate, line in spent[:top]:
+            print("    %-24s %9.3f %11.3f" % (line[:24], seconds, estimate))
+
+# ========
+# REPLAY
+# ========
+
+def replay(entries, port, fromPort=None, timing=False):
+    """ Sends the commands recorded for one port of a trace to a uArm (or the emulator) and
+        waits until they have all been done. Returns (seconds taken, errors)
+    """
+    import uArmFunctions     #needs pyserial
+
+    fromPort, entries = portEntries(entries, fromPort)
+    commands = [(entry["time"], entry["sent"]) for entry in entries if "sent" in entry]
+    uArm = uArmFunctions.openUArm(port)
+    stream = uArmFunctions.gCodeStream(uArm)
+    startTime = time.perf_counter()
+    first = commands[0][0] if commands else 0.0
+    for sent, line in commands:
+        if timing:
+            delay = startTime + (sent - first) - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        stream.send(uArmEmulator.splitNumber(line)[1])
+    errors = stream.barrier()
+    elapsed = time.perf_counter() - startTime
+    uArmFunctions.closeUArm(uArm)
+    return elapsed, errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay uArm g-code traces and estimate drawing times")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    estimate = commands.add_parser("estimate", help="estimate how long g-code takes (every drawing, a trace or a g-code file)")
+    estimate.add_argument("file", nargs="?", help="trace or g-code file (default: every drawing the game makes)")
+    estimate.add_argument("--from", dest="fromPort", help="which port of the trace (default: the first)")
+    estimate.add_argument("--top", type=int, default=5, help="how many of the slowest commands to show (default 5)")
+    estimate.add_argument("--geometry", help="board geometry file (JSON, see drawingFunctions.loadGeometry)")
+    uArmEmulator.addKinematicsArguments(estimate)
+
+    replayer = commands.add_parser("replay", help="send a trace's commands to a uArm or the emulator")
+    replayer.add_argument("file", help="trace file")
+    replayer.add_argument("port", help="serial port of the uArm (eg: /dev/ttyACM0)")
+    replayer.add_argument("--from", dest="fromPort", help="which port of the trace (default: the first)")
+    replayer.add_argument("--timing", action="store_true", help="send each command at the time it was first sent")
+    args = parser.parse_args()
+
+    if args.command == "estimate":
+        kinematics = uArmEmulator.kinematicsFrom(args)
+        if args.geometry:
+            drawingFunctions.loadGeometry(args.geometry)
+        if not args.file:
+            estimateDrawings(kinematics)
+        elif isTrace(args.file):
+            estimateTrace(loadTrace(args.file), kinematics, args.fromPort, args.top)
+        else:
+            estimateGCode(loadGCode(args.file), kinematics)
+    else:
+        entries = loadTrace(args.file)
+        elapsed, errors = replay(entries, args.port, args.fromPort, args.timing)
+        print("Replayed in %.3f s (%s)" % (elapsed, "%d errors" % len(errors) if errors else "no errors"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1065 @@
+#
+#   Noughts and Crosses Game Engine
+#   ===============================
+#
+#   The game rules, board transforms and "experience" learning shared by
+#   Noughts_and_Crosses.py and Noughts_and_Crosses_with_Vision.py
+#
+#   Internally a board is a single int "bitboard" made of two 9-bit masks:
+#
+#       bits 0-8  : the squares holding an X  (bit i set = X in square i)
+#       bits 9-17 : the squares holding an O  (bit 9+i set = O in square i)
+#
+#   using the same square numbering as always:
+#
+#       0|1|2
+#       -----
+#       3|4|5
+#       -----
+#       6|7|8
+#
+#   Moves, win checks and transforms are all mask operations or lookups into
+#   small (512 entry) tables built once when the module is imported. Every
+#   position a real game can reach (5478 of them) is also looked up once at
+#   import, so rootBoard() is a single dictionary lookup.
+#
+#   The old nine character string (eg: "XXOX OOX ") is only used for input and
+#   output: printBrd() and the experience.txt file. Use strToBrd() and brdToStr()
+#   to convert between the two.
+
+import random       #for choosing random moves
+import os           #for syncing the game journal to disk
+import array        #for the compact experience store
+import collections  #journalled games are replayed as ordered dictionaries
+import collections.abc  #the experience store behaves like a dictionary
+import mmap         #for opening binary experience files without copying them
+import struct       #for the binary experience file header
+import sys          #to check the byte order for binary experience files
+import threading    #for saving the experience in the background
+import zlib         #for the binary experience file checksum
+
+# ==============
+# LOOKUP TABLES
+# ==============
+
+EMPTY_BOARD = 0     #no Xs and no Os
+FULL_MASK = 0b111111111
+
+#the 8 winning lines, as masks and as the strings used by uArmFunctions.drawWinLine
+WIN_LINES = (
+    (0b000000111, "012"),
+    (0b000111000, "345"),
+    (0b111000000, "678"),
+    (0b001001001, "036"),
+    (0b010010010, "147"),
+    (0b100100100, "258"),
+    (0b100010001, "048"),
+    (0b001010100, "246"),
+)
+
+#square permutations used by the transforms: new square i = old square PERM[i]
+ROTATE_PERM = (6, 3, 0, 7, 4, 1, 8, 5, 2)      #clockwise
+UNROTATE_PERM = (2, 5, 8, 1, 4, 7, 0, 3, 6)    #anti-clockwise
+FLIP_PERM = (0, 3, 6, 1, 4, 7, 2, 5, 8)        #reflect about the diagonal
+
+def permTable(perm):
+    """ Returns a 512 entry table mapping a 9-bit mask to the mask with its squares moved by 'perm' """
+    table = []
+    for mask in range(512):
+        newMask = 0
+        for i in range(9):
+            if mask >> perm[i] & 1:
+                newMask |= 1 << i
+        table.append(newMask)
+    return table
+
+ROTATE = permTable(ROTATE_PERM)
+UNROTATE = permTable(UNROTATE_PERM)
+FLIP = permTable(FLIP_PERM)
+
+#the 8 symmetries of the board, in the order rootBoard has always tried them:
+#three clockwise rotations, no rotation, then the flipped board rotated the same way
+#(SYMMETRY_PERMS[t][i] is the square of the original board that ends up in square i)
+SYMMETRIES = []
+SYMMETRY_PERMS = []
+perm = tuple(range(9))
+for tf in "rrrrfrrr":
+    if tf == "r":
+        perm = tuple(perm[p] for p in ROTATE_PERM)
+    else:
+        perm = tuple(perm[p] for p in FLIP_PERM)
+    SYMMETRIES.append(permTable(perm))
+    SYMMETRY_PERMS.append(perm)
+del perm, tf
+
+#how many squares are set in each mask
+COUNT = [bin(mask).count("1") for mask in range(512)]
+
+#does the mask contain a complete winning line?
+WON = [any(mask & line == line for line, _ in WIN_LINES) for mask in range(512)]
+
+#the single square bits in each mask, lowest square first
+SQUARE_BITS = [tuple(1 << i for i in range(9) if mask >> i & 1) for mask in range(512)]
+
+#the square numbers in each mask, lowest square first
+SQUARES = [tuple(i for i in range(9) if mask >> i & 1) for mask in range(512)]
+
+#the winning lines through each square (2 for an edge, 3 for a corner, 4 for the centre)
+LINES_THROUGH = [tuple((line, lineStr) for line, lineStr in WIN_LINES if line >> square & 1) for square in range(9)]
+
+#base 3 value of each mask with square 0 as the most significant digit.
+#2*TERNARY[x] + TERNARY[o] orders boards exactly like the old string score
+#(X=2, O=1, empty=0 read as a nine digit number)
+TERNARY = [sum(3 ** (8 - i) for i in range(9) if mask >> i & 1) for mask in range(512)]
+
+# ===================
+# BOARD CONVERSIONS
+# ===================
+
+def strToBrd(brdStr):
+    """ Returns the bitboard for a nine character board string such as "XXOX OOX " """
+    brd = 0
+    for i in range(9):
+        if brdStr[i] == "X":
+            brd |= 1 << i
+        elif brdStr[i] == "O":
+            brd |= 1 << (9 + i)
+    return brd
+
+def brdToStr(brd):
+    """ Returns the nine character board string for a bitboard """
+    brdStr = ""
+    for i in range(9):
+        if brd >> i & 1:
+            brdStr = brdStr + "X"
+        elif brd >> (9 + i) & 1:
+            brdStr = brdStr + "O"
+        else:
+            brdStr = brdStr + " "
+    return brdStr
+
+def squareAt(brd, square):
+    """ Returns "X", "O" or " " for a square on the board """
+    if brd >> square & 1:
+        return "X"
+    if brd >> (9 + square) & 1:
+        return "O"
+    return " "
+
+def nextPlayer(brd):
+    """ Returns whose turn it is ("X" always moves first) """
+    if COUNT[brd & FULL_MASK] == COUNT[brd >> 9]:
+        return "X"
+    return "O"
+
+def moveSquare(before, after):
+    """ Returns the square of the move that turned board 'before' into board 'after' """
+    diff = after ^ before
+    return ((diff | diff >> 9) & FULL_MASK).bit_length() - 1
+
+def makeMove(brd, square):
+    """ Returns the board after the player whose turn it is moves into 'square' """
+    if COUNT[brd & FULL_MASK] == COUNT[brd >> 9]:
+        return brd | 1 << square
+    return brd | 1 << (9 + square)
+
+def printBrd(brd):
+    """ Outputs the board represented by 'brd' to the screen
+        'brd' can be a bitboard or a nine character string (eg: "012345678" to show the square numbers)
+    """
+    if not isinstance(brd, str):
+        brd = brdToStr(brd)
+    print(brd[0],"|",brd[1],"|",brd[2], sep="")
+    print("-----")
+    print(brd[3],"|",brd[4],"|",brd[5], sep="")
+    print("-----")
+    print(brd[6],"|",brd[7],"|",brd[8], sep="")
+
+# ============
+# GAME RULES
+# ============
+
+def checkWin(brd, square=None):
+    """ Check to see if the last move ended the game, only looking at the lines through 'square'
+        (the square just played). Without 'square', all lines of the player who moved last are checked.
+        Returns (winner, winLine):
+            winner: 'X', 'O' or 'D' (Draw) or 'N' (no result yet)
+            winLine: the winning line for uArmFunctions.drawWinLine (eg: "012" or "246"), or "" if no one has won
+    """
+    xBits = brd & FULL_MASK
+    oBits = brd >> 9
+    if square is None:
+        if COUNT[xBits] > COUNT[oBits]:
+            player, mask, lines = "X", xBits, WIN_LINES
+        else:
+            player, mask, lines = "O", oBits, WIN_LINES
+    elif xBits >> square & 1:
+        player, mask, lines = "X", xBits, LINES_THROUGH[square]
+    else:
+        player, mask, lines = "O", oBits, LINES_THROUGH[square]
+
+    for line, lineStr in lines:
+        if mask & line == line:
+            return player, lineStr
+
+    #no winner, so check for a draw (board has no empty spaces)
+    if xBits | oBits == FULL_MASK:
+        return "D", ""
+
+    #If there's no winner, and no draw, the game is still underway:
+    return "N", ""
+
+def isGameWon(brd):
+    """ Check to see if the game has been won:
+        Returns winner: 'X', 'O' or 'D' (Draw) or 'N' (no result yet)
+    """
+    if WON[brd >> 9]:
+        return "O"
+    if WON[brd & FULL_MASK]:
+        return "X"
+
+    #no winner, so check for a draw (board has no empty spaces)
+    if (brd | brd >> 9) & FULL_MASK == FULL_MASK:
+        return "D"
+
+    #If there's no winner, and no draw, the game is still underway:
+    return "N"
+
+def nextMoves(brd):
+    """ Creates a list of all possible next moves
+        Assumes "X" always goes first when determining whose turn it is
+    """
+    xBits = brd & FULL_MASK
+    oBits = brd >> 9
+    free = FULL_MASK & ~(xBits | oBits)
+    if COUNT[xBits] == COUNT[oBits]:
+        return [brd | bit for bit in SQUARE_BITS[free]]
+    return [brd | bit << 9 for bit in SQUARE_BITS[free]]
+
+# ============
+# TRANSFORMS
+# ============
+
+def tfRotate(brd):
+    """ Returns the board rotated once clockwise """
+    return ROTATE[brd & FULL_MASK] | ROTATE[brd >> 9] << 9
+
+def tfUnrotate(brd):
+    """ Returns the board rotated once anti-clockwise """
+    return UNROTATE[brd & FULL_MASK] | UNROTATE[brd >> 9] << 9
+
+def tfFlip(brd):
+    """ Returns the board flipped (reflected) about the diagonal """
+    return FLIP[brd & FULL_MASK] | FLIP[brd >> 9] << 9
+
+def tfToggle(brd):
+    """ Returns the board with O and X toggled """
+    return brd >> 9 | (brd & FULL_MASK) << 9
+
+def tfSymmetry(brd, t):
+    """ Returns the board transformed by the symmetry SYMMETRIES[t] """
+    table = SYMMETRIES[t]
+    return table[brd & FULL_MASK] | table[brd >> 9] << 9
+
+def tfInt(brd):
+    """ Returns the board as an int "score" with
+        empty = 0
+            O = 1
+            X = 2
+        as the digits of a base 3 number, square 0 first
+    """
+    return 2 * TERNARY[brd & FULL_MASK] + TERNARY[brd >> 9]
+
+def calcRootBoard(brd):
+    """ Works out the 'root' board for the given board by trying all 8 symmetries.
+        Returns the root board and the index into SYMMETRIES of the transform that gives it
+    """
+    xBits = brd & FULL_MASK
+    oBits = brd >> 9
+    rootScore = -1
+    for t, table in enumerate(SYMMETRIES):
+        tfX = table[xBits]
+        tfO = table[oBits]
+        score = 2 * TERNARY[tfX] + TERNARY[tfO]
+        if score > rootScore:
+            rootScore = score
+            rootBrd = tfX | tfO << 9
+            rootTf = t
+    return rootBrd, rootTf
+
+def rootBoard(brd):
+    """ Returns a unique 'root' board for the given board.
+        This is because many different board positions are logically identical, just rotated or flipped
+        versions of a different board. This version matches those logically idential boards by
+        picking the highest scoring of the 8 symmetries.
+        Every position that can happen in a real game is looked up in ROOT_OF
+    """
+    try:
+        return ROOT_OF[brd]
+    except KeyError:                #not a position a real game can reach, so work it out
+        return calcRootBoard(brd)[0]
+
+# =====================
+# CANONICAL POSITIONS
+# =====================
+
+def buildCanonicalTables():
+    """ Finds every position reachable in a real game (5478 of them, including the empty board)
+        and the 765 different root boards they reduce to, then fills in:
+            ROOTS        - canonical index -> root board (ordered by move number, then board)
+            ROOT_OF      - position -> its root board
+            INDEX_OF     - position -> canonical index of its root board
+            TRANSFORM_OF - position -> index into SYMMETRIES of the transform that gives its root board
+    """
+    positions = [EMPTY_BOARD]
+    seen = {EMPTY_BOARD}
+    for brd in positions:                   #the list grows as new positions are found
+        if isGameWon(brd) == "N":
+            for m in nextMoves(brd):
+                if m not in seen:
+                    seen.add(m)
+                    positions.append(m)
+
+    for brd in positions:
+        ROOT_OF[brd], TRANSFORM_OF[brd] = calcRootBoard(brd)
+
+    ROOTS.extend(sorted(set(ROOT_OF.values()), key=lambda root: (COUNT[root & FULL_MASK] + COUNT[root >> 9], root)))
+    rootIndex = {root: i for i, root in enumerate(ROOTS)}
+    for brd in positions:
+        INDEX_OF[brd] = rootIndex[ROOT_OF[brd]]
+
+ROOTS = []
+ROOT_OF = {}
+INDEX_OF = {}
+TRANSFORM_OF = {}
+buildCanonicalTables()
+
+# =================
+# COMPILED POLICY
+# =================
+#
+#   For every root board where the game isn't over, the policy holds the best
+#   move(s) according to the experience lists, so findBestMove is one lookup.
+#   Moves are stored as squares of the root board; SYMMETRY_PERMS turns them back
+#   into squares of the real board.
+#
+#       POLICY_MOVES[i] - the squares with the most votes (empty if no move has more than 0 votes)
+#       POLICY_VOTES[i] - the votes those moves have
+#
+#   learnFromGame keeps the policy up to date. Anything else that changes
+#   X_Experience or O_Experience needs to call compilePolicy() afterwards.
+
+def buildPolicyTables():
+    """ Fills in the moves from each root board, which of them win straight away,
+        and which root boards each root board can be reached from
+    """
+    for index, root in enumerate(ROOTS):
+        moves = []
+        wins = []
+        if isGameWon(root) == "N":
+            for m, square in zip(nextMoves(root), SQUARES[FULL_MASK & ~(root | root >> 9)]):
+                moves.append((square, ROOT_OF[m]))
+                if checkWin(m, square)[0] == nextPlayer(root):
+                    wins.append(square)
+                parents = PARENTS[INDEX_OF[m]]
+                if index not in parents:
+                    parents.append(index)
+        MOVES_OF.append(tuple(moves))
+        WINNING_SQUARES.append(tuple(wins))
+
+def updatePolicy(index):
+    """ Works out the best moves from the root board ROOTS[index] using the experience lists """
+    root = ROOTS[index]
+    if COUNT[root & FULL_MASK] == COUNT[root >> 9]:
+        experience = X_Experience
+    else:
+        experience = O_Experience
+
+    maxVotes = 0
+    bestSquares = []
+    for square, child in MOVES_OF[index]:
+        if child in experience:
+            votes = experience[child]
+            if votes > maxVotes:
+                maxVotes = votes
+                bestSquares = [square]
+            elif votes == maxVotes and bestSquares:
+                bestSquares.append(square)
+    POLICY_MOVES[index] = tuple(bestSquares)
+    POLICY_VOTES[index] = maxVotes
+
+def compilePolicy():
+    """ Rebuilds the whole policy from the experience lists """
+    for index in range(len(ROOTS)):
+        updatePolicy(index)
+
+def savePolicy(fileName="policy.txt"):
+    """ Saves the policy to a file, one root board per line: board : best squares : votes
+        (only boards with a best move are saved, the rest are played randomly)
+    """
+    with open(fileName, "w") as policyFile:
+        policyFile.write("Game Count=" + str(gameCount) + "\n")
+        for index, root in enumerate(ROOTS):
+            if POLICY_MOVES[index]:
+                squares = "".join(str(square) for square in POLICY_MOVES[index])
+                policyFile.write(brdToStr(root) + " : " + squares + " : " + str(POLICY_VOTES[index]) + "\n")
+
+def loadPolicy(fileName="policy.txt"):
+    """ Loads a policy saved by savePolicy, replacing the current one.
+        Lets the computer play from a policy without its experience lists
+        (learnFromGame will rebuild the entries it changes from the experience lists)
+    """
+    for index in range(len(ROOTS)):
+        POLICY_MOVES[index] = ()
+        POLICY_VOTES[index] = 0
+
+    with open(fileName, "r") as policyFile:
+        for line in policyFile:
+            if line[10:11] == ":":
+                brd, squares, votes = line.split(":")
+                index = INDEX_OF[rootBoard(strToBrd(brd))]
+                POLICY_MOVES[index] = tuple(int(square) for square in squares.strip())
+                POLICY_VOTES[index] = int(votes)
+
+MOVES_OF = []                       #root index -> ((square, root board after the move), ...)
+WINNING_SQUARES = []                #root index -> squares that win straight away
+PARENTS = [[] for root in ROOTS]    #root index -> root indexes one move earlier
+POLICY_MOVES = [() for root in ROOTS]
+POLICY_VOTES = [0 for root in ROOTS]
+buildPolicyTables()
+
+# ==========
+# LEARNING
+# ==========
+
+def findBestMove(brd):
+    """ Returns the board after the computer's move, chosen using the compiled policy:
+        a winning move if there is one, else one of the moves with the most votes,
+        else (if no move has more than 0 votes) a random move
+    """
+    index = INDEX_OF.get(brd)
+    if index is None:                                           #not a position a real game can reach
+        return searchBestMove(brd)
+
+    squares = WINNING_SQUARES[index] or POLICY_MOVES[index]
+    if squares:
+        perm = SYMMETRY_PERMS[TRANSFORM_OF[brd]]                #turn the root board's square back into this board's
+        return makeMove(brd, perm[random.choice(squares)])
+    return random.choice(nextMoves(brd))
+
+def lookAhead(brd):
+    """ Works out the computer's reply to every move the human can make from 'brd', so the reply is
+        ready as soon as the human's move is known (eg: while the robot is still drawing)
+        Returns {board after the human's move: board after the computer's reply}
+        (moves that finish the game have no reply)
+    """
+    replies = {}
+    for square in SQUARES[FULL_MASK & ~(brd | brd >> 9)]:
+        humanBrd = makeMove(brd, square)
+        if checkWin(humanBrd, square)[0] == "N":
+            replies[humanBrd] = findBestMove(humanBrd)
+    return replies
+
+def searchBestMove(brd):
+    """ Returns the board after the computer's move, found by checking every move against the experience lists
+        (findBestMove without the compiled policy)
+    """
+    moves = nextMoves(brd)
+    maxVotes = 0
+    bestMove = random.choice(moves)
+
+    if COUNT[brd & FULL_MASK] == COUNT[brd >> 9]:               #if it's X's move
+        player = "X"
+        experience = X_Experience
+    else:                                                       #if it's O's move
+        player = "O"
+        experience = O_Experience
+
+    for m, square in zip(moves, SQUARES[FULL_MASK & ~(brd | brd >> 9)]):
+        if checkWin(m, square)[0] == player:                    #if the move results in a win, just take it!
+            return m
+        root = rootBoard(m)
+        if root in experience:                                  #otherwise look for the best move in the experience list
+            if experience[root] > maxVotes:
+                bestMove = m
+                maxVotes = experience[root]
+    return bestMove
+
+def learnFromGame(Game):
+    """ Remembers the moves that lead to a win in the X_Experience or O_Experience lists
+        'Game' is the (ordered) root boards after each move
+    """
+    lastBrd = next(reversed(Game))                      #get the last board in the Game to check the result
+    Winner = checkWin(lastBrd)[0]
+
+    if Winner == "X":
+        for g in Game:
+            if COUNT[g & FULL_MASK] > COUNT[g >> 9]:    #every move of X's was good!
+                if g in X_Experience:
+                    X_Experience[g]=X_Experience[g]+2   #if the move is known, increment vote by 2
+                else:
+                    X_Experience[g]=2                   #else add it into the experience with vote=2
+
+            else:                                       #every move of O's was bad!
+                if g in O_Experience:
+                    O_Experience[g]=O_Experience[g]-2   #if the move is known, decrement vote by 2
+                else:
+                    O_Experience[g]=-2                  #else add it into the experience with vote=-2
+
+    if Winner == "O":
+        for g in Game:
+            if COUNT[g & FULL_MASK] == COUNT[g >> 9]:   #every move of O's was good!
+                if g in O_Experience:
+                    O_Experience[g]=O_Experience[g]+2   #if the move is known, increment vote by 2
+                else:
+                    O_Experience[g]=2                   #else add it into the experience with vote=2
+
+            else:                                       #every move of X's was bad!
+                if g in X_Experience:
+                    X_Experience[g]=X_Experience[g]-2   #if the move is known, decrement vote
+                else:
+                    X_Experience[g]=-2                  #else add it into the experience with vote=-2
+
+    if Winner == "D":                                   #If the game was a draw, that's better than 'unknown', so
+        for g in Game:
+            if COUNT[g & FULL_MASK] > COUNT[g >> 9]:    #every move of X's was not great, but 'ok'!
+                if g not in X_Experience:
+                    X_Experience[g]=1                   #add it into the experience with vote=1
+
+            else:                                       #every move of O's was also not great, but 'ok'!
+                if g in O_Experience:
+                    O_Experience[g]=1                   #else add it into the experience with vote=1
+
+    #the votes have changed, so update the policy for the boards these moves were made from
+    for g in Game:
+        if g in INDEX_OF:
+            for parent in PARENTS[INDEX_OF[g]]:
+                updatePolicy(parent)
+
+# ============
+# EXPERIENCE
+# ============
+
+class ExperienceStore(collections.abc.MutableMapping):
+    """ An experience list that works like a dictionary of {root board: votes}, but keeps the votes
+        in a fixed array indexed by canonical index (INDEX_OF), with a bitmap of which boards are known.
+        About 4 bytes per root board instead of 100+ bytes per dictionary entry, so lots of copies
+        can be kept in memory.
+
+        'votes' and 'known' can be passed in to use existing buffers (eg: a memory mapped file):
+            votes - NUM_ROOTS signed 32 bit ints
+            known - NUM_ROOTS bits, lowest bit of the first byte first
+        Boards that aren't root boards of a real game (eg: from a hand-edited file) are kept in an
+        ordinary dictionary, 'extra', so nothing is lost.
+    """
+
+    def __init__(self, experience=None, votes=None, known=None):
+        if votes is None:
+            votes = array.array("i", bytes(4 * NUM_ROOTS))
+        if known is None:
+            known = bytearray((NUM_ROOTS + 7) // 8)
+        self.votes = votes
+        self.known = known
+        self.extra = {}
+        self.size = sum(COUNT[byte] for byte in known)
+        if experience is not None:
+            self.update(experience)
+
+    def __getitem__(self, brd):
+        index = ROOT_INDEX.get(brd)
+        if index is None:
+            return self.extra[brd]
+        if self.known[index >> 3] >> (index & 7) & 1:
+            return self.votes[index]
+        raise KeyError(brd)
+
+    def __contains__(self, brd):
+        index = ROOT_INDEX.get(brd)
+        if index is None:
+            return brd in self.extra
+        return self.known[index >> 3] >> (index & 7) & 1 == 1
+
+    def __setitem__(self, brd, votes):
+        index = ROOT_INDEX.get(brd)
+        if index is None:
+            self.extra[brd] = votes
+            return
+        if not self.known[index >> 3] >> (index & 7) & 1:
+            self.known[index >> 3] |= 1 << (index & 7)
+            self.size = self.size + 1
+        self.votes[index] = votes
+
+    def __delitem__(self, brd):
+        index = ROOT_INDEX.get(brd)
+        if index is None:
+            del self.extra[brd]
+            return
+        if not self.known[index >> 3] >> (index & 7) & 1:
+            raise KeyError(brd)
+        self.known[index >> 3] &= ~(1 << (index & 7))
+        self.votes[index] = 0
+        self.size = self.size - 1
+
+    def __iter__(self):
+        for index in range(NUM_ROOTS):
+            if self.known[index >> 3] >> (index & 7) & 1:
+                yield ROOTS[index]
+        yield from self.extra
+
+    def __len__(self):
+        return self.size + len(self.extra)
+
+    def copy(self):
+        """ Returns a separate copy of the store (copies two small buffers) """
+        store = ExperienceStore(votes=array.array("i", self.votes), known=bytearray(self.known))
+        store.extra = dict(self.extra)
+        return store
+
+    def __reduce__(self):
+        #pickle a copy of the buffers, so stores backed by a memory mapped file can be sent to other processes
+        return (ExperienceStore, (self.extra, array.array("i", self.votes), bytearray(self.known)))
+
+NUM_ROOTS = len(ROOTS)
+ROOT_INDEX = {root: index for index, root in enumerate(ROOTS)}     #root board -> canonical index
+
+def printExperience():
+
+    #Print out X_Experience, showing votes
+    print("X Experience:")
+    for x in X_Experience:
+        print(brdToStr(x)," : ",X_Experience[x])
+
+    #Print out O_Experience, showing votes
+    print("O Experience:")
+    for x in O_Experience:
+        print(brdToStr(x)," : ",O_Experience[x])
+    print("")
+
+def experienceDelta(before, after):
+    """ Returns the vote changes that turn the experience list 'before' into 'after'
+        (boards that are new in 'after' are included even if their vote is 0)
+    """
+    delta = {}
+    for brd in after:
+        if brd not in before:
+            delta[brd] = after[brd]
+        elif after[brd] != before[brd]:
+            delta[brd] = after[brd] - before[brd]
+    return delta
+
+def addExperience(experience, delta):
+    """ Adds the vote changes in 'delta' into an experience list (boards it doesn't know start at 0) """
+    for brd in delta:
+        if brd in experience:
+            experience[brd] = experience[brd] + delta[brd]
+        else:
+            experience[brd] = delta[brd]
+
+def writeFileAtomically(fileName, data):
+    '''Writes 'data' (bytes) to a temporary file, syncs it to disk, then renames it over 'fileName',
+       so the file is always either the old version or the new one, never half written'''
+    tempName = fileName + ".tmp"
+    with open(tempName, "wb") as tempFile:
+        tempFile.write(data)
+        tempFile.flush()
+        os.fsync(tempFile.fileno())
+    os.replace(tempName, fileName)
+
+def experienceText(xExperience, oExperience, games):
+    '''Returns the experience.txt file contents for two experience lists and a game count'''
+    lines = ["Game Count=" + str(games) + "\n"]
+
+    lines.append("Experience for X:\n")
+    for x in xExperience:
+        lines.append(brdToStr(x) + " : " + str(xExperience[x]) + "\n")
+
+    lines.append("Experience for O:\n")
+    for o in oExperience:
+        lines.append(brdToStr(o) + " : " + str(oExperience[o]) + "\n")
+
+    return "".join(lines)
+
+def saveExperience(fileName="experience.txt"):
+    '''Saves the experience dictionary into a file called 'experience.txt' (or 'fileName')'''
+
+    print("Saving Experience:")
+    writeFileAtomically(fileName, experienceText(X_Experience, O_Experience, gameCount).encode("utf-8"))
+
+# ==========================
+# BINARY EXPERIENCE FILES
+# ==========================
+#
+#   A binary experience file (eg: experience.bin) is a fixed 32 byte header
+#   followed by the two experience lists as dense arrays, all little-endian:
+#
+#       header   magic "OXEX", version (uint16), number of root boards (uint16),
+#                game count (uint64), CRC32 of everything after the header (uint32),
+#                number of extra X boards (uint32), number of extra O boards (uint32), 4 spare bytes
+#       votes    X votes, then O votes: one int32 per root board, in canonical index order
+#       known    X bitmap, then O bitmap: one bit per root board, lowest bit of the first byte first
+#       extra    (board uint32, votes int32) pairs for boards that aren't root boards, X's then O's
+#
+#   The file is opened with mmap (copy-on-write), so on a little-endian machine the
+#   experience lists use the file's pages directly and loading copies nothing.
+#   convertExperience.py converts between this and the experience.txt text format.
+
+EXPERIENCE_MAGIC = b"OXEX"
+EXPERIENCE_VERSION = 1
+EXPERIENCE_HEADER = struct.Struct("<4sHHQIII4x")
+EXTRA_ENTRY = struct.Struct("<Ii")
+
+def experienceBytes(xExperience, oExperience, games):
+    '''Returns the binary experience file contents for two experience lists and a game count'''
+    stores = []
+    for experience in (xExperience, oExperience):
+        if not isinstance(experience, ExperienceStore):
+            experience = ExperienceStore(experience)
+        stores.append(experience)
+
+    body = bytearray()
+    for store in stores:
+        votes = array.array("i", store.votes)
+        if sys.byteorder == "big":
+            votes.byteswap()
+        body += votes.tobytes()
+    for store in stores:
+        body += store.known
+    for store in stores:
+        for brd in store.extra:
+            body += EXTRA_ENTRY.pack(brd, store.extra[brd])
+
+    header = EXPERIENCE_HEADER.pack(EXPERIENCE_MAGIC, EXPERIENCE_VERSION, NUM_ROOTS, games,
+                                    zlib.crc32(body), len(stores[0].extra), len(stores[1].extra))
+    return header + body
+
+def saveExperienceBinary(fileName="experience.bin"):
+    '''Saves the experience lists into a binary experience file'''
+
+    print("Saving Experience:")
+    writeFileAtomically(fileName, experienceBytes(X_Experience, O_Experience, gameCount))
+
+def openExperienceBinary(fileName="experience.bin"):
+    '''Opens a binary experience file (mmapped) and returns (games, X experience, O experience)
+       or None if the file is the wrong version or corrupt'''
+    with open(fileName, "rb") as expFile:
+        if os.fstat(expFile.fileno()).st_size < EXPERIENCE_HEADER.size:
+            print("Experience file", fileName, "is corrupt (too short)")
+            return None
+        expMap = mmap.mmap(expFile.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    magic, version, numRoots, games, checksum, xExtra, oExtra = EXPERIENCE_HEADER.unpack_from(expMap)
+    if magic != EXPERIENCE_MAGIC or version != EXPERIENCE_VERSION or numRoots != NUM_ROOTS:
+        print("Experience file", fileName, "is not a version", EXPERIENCE_VERSION, "experience file")
+        return None
+
+    #byte offsets of each part of the file
+    votesSize = 4 * NUM_ROOTS
+    knownSize = (NUM_ROOTS + 7) // 8
+    xVotes = EXPERIENCE_HEADER.size
+    oVotes = xVotes + votesSize
+    xKnown = oVotes + votesSize
+    oKnown = xKnown + knownSize
+    extra = oKnown + knownSize
+
+    if len(expMap) != extra + (xExtra + oExtra) * EXTRA_ENTRY.size:
+        print("Experience file", fileName, "is corrupt (wrong size)")
+        return None
+    if zlib.crc32(memoryview(expMap)[EXPERIENCE_HEADER.size:]) != checksum:
+        print("Experience file", fileName, "is corrupt (bad checksum)")
+        return None
+
+    view = memoryview(expMap)
+    stores = []
+    for votesStart, knownStart in ((xVotes, xKnown), (oVotes, oKnown)):
+        if sys.byteorder == "little":
+            votes = view[votesStart:votesStart + votesSize].cast("i")
+        else:
+            votes = array.array("i", view[votesStart:votesStart + votesSize])
+            votes.byteswap()
+        stores.append(ExperienceStore(votes=votes, known=view[knownStart:knownStart + knownSize]))
+
+    for store, count in ((stores[0], xExtra), (stores[1], oExtra)):
+        for n in range(count):
+            brd, votes = EXTRA_ENTRY.unpack_from(expMap, extra)
+            store.extra[brd] = votes
+            extra = extra + EXTRA_ENTRY.size
+
+    return games, stores[0], stores[1]
+
+def loadExperienceBinary(fileName="experience.bin"):
+    '''Loads the experience from a binary experience file into the X_Experience and O_Experience'''
+    global X_Experience
+    global O_Experience
+    global gameCount
+
+    X_Experience=ExperienceStore()
+    O_Experience=ExperienceStore()
+    gameCount=0
+
+    opened = openExperienceBinary(fileName)
+    if opened is not None:
+        gameCount, X_Experience, O_Experience = opened
+        print("loading experience from", gameCount, "games...")
+    compilePolicy()                 #even with no experience, so the old policy isn't played from
+
+def isBinaryExperience(fileName):
+    '''Returns True if the file is a binary experience file'''
+    try:
+        with open(fileName, "rb") as expFile:
+            return expFile.read(len(EXPERIENCE_MAGIC)) == EXPERIENCE_MAGIC
+    except IOError:
+        return False
+
+def readExperience(fileName="experience.txt"):
+    '''Reads an experience file (text or binary) a line at a time, without loading it into X_Experience and O_Experience
+       Yields ("Game Count", None, games) then ("X", board, votes) or ("O", board, votes) for every board'''
+    if isBinaryExperience(fileName):
+        opened = openExperienceBinary(fileName)
+        if opened is not None:
+            games, xExperience, oExperience = opened
+            yield "Game Count", None, games
+            for player, experience in (("X", xExperience), ("O", oExperience)):
+                for brd, votes in experience.items():
+                    yield player, brd, votes
+        return
+
+    loading=""
+    with open(fileName, "r") as expFile:
+        for line in expFile:
+            if line[:11] == "Game Count=":
+                yield "Game Count", None, int(line[11:])
+            elif line[:16] == "Experience for X":
+                loading="X"
+            elif line[:16] == "Experience for O":
+                loading="O"
+            elif line[10:11]==":" and loading:
+                brd,score = line.split(":")
+                yield loading, strToBrd(brd), int(score)
+
+def loadExperience(fileName="experience.txt"):
+    '''Loads the experience from the file "experience.txt" (or 'fileName') into the X_Experience and O_Experience
+       (binary experience files are recognised and loaded with loadExperienceBinary)'''
+    global X_Experience
+    global O_Experience
+    global gameCount
+
+    if isBinaryExperience(fileName):
+        loadExperienceBinary(fileName)
+        replayJournal(journalName(fileName))
+        return
+
+    X_Experience=ExperienceStore()  #This is the list of boards after X's move with votes showing how good each board situation is
+    O_Experience=ExperienceStore()  #This is the list of boards after O's move with votes showing how good each board situation is
+    gameCount=0                 #How many games have been played? (how experienced is the computer?)
+
+    try:
+        for player, brd, votes in readExperience(fileName):
+            if player == "X":
+                X_Experience[brd]=votes
+            elif player == "O":
+                O_Experience[brd]=votes
+            else:
+                gameCount=votes
+                print("loading experience from", gameCount, "games...")
+    except IOError:
+        print("No experience file found")
+
+    compilePolicy()
+    replayJournal(journalName(fileName))
+
+# ==============
+# GAME JOURNAL
+# ==============
+#
+#   Instead of rewriting the whole experience file after every game, each
+#   finished game is appended to a journal next to it (experience.txt ->
+#   experience.journal) as one line, synced to disk straight away:
+#
+#       game number:result:board after move 1|board after move 2|...
+#
+#   The experience file is a "snapshot": its Game Count says which games it
+#   already includes. loadExperience loads the snapshot, then replays any later
+#   games from the journal through learnFromGame. ExperienceWriter writes a new
+#   snapshot (to a temporary file, then renamed over the old one) and removes the
+#   games it includes from the journal. A crash at any point loses at most the
+#   game being written (which ExperienceWriter cuts off the journal before
+#   adding to it), and a line that has been damaged is skipped (with a
+#   message) rather than stopping the experience loading.
+
+COMPACT_GAMES = 50          #how many journalled games before ExperienceWriter writes a new snapshot
+
+def journalName(fileName="experience.txt"):
+    '''Returns the name of the game journal for an experience file'''
+    return os.path.splitext(fileName)[0] + ".journal"
+
+def journalLine(Game, result):
+    '''Returns the journal line for a finished game ('gameCount' should already include it)'''
+    return str(gameCount) + ":" + result + ":" + "|".join(brdToStr(g) for g in Game) + "\n"
+
+def readJournal(journalFile):
+    '''Reads a game journal, returns [(game number, result, boards, line)] for every game in it
+       (a line that can't be read, eg: from a disk error, is printed and skipped)'''
+    games = []
+    with open(journalFile, "r") as journal:
+        for line in journal:
+            if not line.endswith("\n"):            #a game that was still being written when the program stopped
+                break
+            fields = line[:-1].split(":")
+            boards = fields[2].split("|") if len(fields) == 3 else []
+            if not fields[0].isdigit() or not boards or any(len(brd) != 9 or strToBrd(brd) not in INDEX_OF for brd in boards):
+                print("Skipping a bad line in", journalFile + ":", repr(line[:40]))
+                continue
+            games.append((int(fields[0]), fields[1], [strToBrd(brd) for brd in boards], line))
+    return games
+
+def endJournal(journalFile):
+    '''Cuts a game that was still being written when the program stopped (a last line with no newline)
+       off the end of the journal, so the next game written starts on a line of its own'''
+    try:
+        with open(journalFile, "r+b") as journal:
+            size = journal.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            journal.seek(size - 1)
+            if journal.read(1) != b"\n":
+                journal.seek(0)
+                journal.truncate(journal.read().rfind(b"\n") + 1)
+    except IOError:
+        return
+
+def replayJournal(journalFile):
+    '''Learns from every game in the journal that isn't already in the experience (game number > gameCount)'''
+    global gameCount
+
+    try:
+        games = readJournal(journalFile)
+    except IOError:
+        return
+
+    replayed = 0
+    for number, result, boards, line in games:
+        if number > gameCount:
+            learnFromGame(collections.OrderedDict((brd, 0) for brd in boards))
+            gameCount = number
+            replayed = replayed + 1
+    if replayed:
+        print("replayed", replayed, "games from", journalFile)
+
+def writeSnapshot(fileName, xExperience, oExperience, games):
+    '''Writes an experience snapshot, binary if the file name ends in ".bin", otherwise text'''
+    if fileName.endswith(".bin"):
+        writeFileAtomically(fileName, experienceBytes(xExperience, oExperience, games))
+    else:
+        writeFileAtomically(fileName, experienceText(xExperience, oExperience, games).encode("utf-8"))
+
+def trimJournal(fileName, games):
+    '''Removes the games a snapshot of 'games' games already includes from the journal'''
+    journalFile = journalName(fileName)
+    try:
+        keep = [line for number, result, boards, line in readJournal(journalFile) if number > games]
+    except IOError:
+        return
+    writeFileAtomically(journalFile, "".join(keep).encode("utf-8"))
+
+# ===================
+# BACKGROUND SAVING
+# ===================
+
+class ExperienceWriter:
+    """ Does all the experience file writing on a background thread, so the next game can start as soon as
+        learnFromGame returns.
+            journal(Game, result) - queue a finished game for the journal (and a snapshot every COMPACT_GAMES games)
+            save()                - queue a snapshot of the experience as it is now
+            flush()               - wait until everything queued has been written
+            close()               - save, flush and stop the thread (eg: with atexit)
+        A snapshot is just a copy of the two experience stores, so save() is quick. If several snapshots
+        are queued before the thread gets to them, only the newest is written.
+        All files are written to a temporary file and renamed, so they are never half written.
+        A write that fails (eg: the disk is full) is printed and the thread carries on; if the thread
+        stops anyway, flush() and close() stop waiting for it.
+    """
+
+    def __init__(self, fileName="experience.txt"):
+        self.fileName = fileName
+        self.condition = threading.Condition()
+        self.journalLines = []          #journal lines waiting to be written, oldest first
+        self.snapshot = None            #(X_Experience, O_Experience, gameCount) waiting to be written
+        self.busy = False               #True while the thread is writing
+        self.running = True
+        self.stopped = False            #True once the thread has finished
+        self.thread = threading.Thread(target=self.run, name="ExperienceWriter", daemon=True)
+        self.thread.start()
+
+    def journal(self, Game, result):
+        with self.condition:
+            self.journalLines.append(journalLine(Game, result))
+            self.condition.notify()
+        if gameCount % COMPACT_GAMES == 0:
+            self.save()
+
+    def save(self):
+        snapshot = (X_Experience.copy(), O_Experience.copy(), gameCount)
+        with self.condition:
+            self.snapshot = snapshot    #replaces any snapshot that hasn't been written yet
+            self.condition.notify()
+
+    def flush(self):
+        with self.condition:
+            while (self.journalLines or self.snapshot or self.busy) and not self.stopped:
+                self.condition.wait()
+
+    def close(self):
+        self.save()
+        self.flush()
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+
+    def run(self):
+        try:
+            self.write()
+        finally:
+            with self.condition:
+                self.busy = False
+                self.stopped = True
+                self.condition.notify_all()
+
+    def write(self):
+        while True:
+            with self.condition:
+                while self.running and not self.journalLines and not self.snapshot:
+                    self.condition.wait()
+                if not self.running and not self.journalLines and not self.snapshot:
+                    return
+                lines, self.journalLines = self.journalLines, []
+                snapshot, self.snapshot = self.snapshot, None
+                self.busy = True
+
+            try:
+                #the journal lines were queued before the snapshot was taken, so write them first
+                if lines:
+                    try:
+                        endJournal(journalName(self.fileName))
+                        with open(journalName(self.fileName), "a") as journal:
+                            journal.write("".join(lines))
+                            journal.flush()
+                            os.fsync(journal.fileno())
+                    except (IOError, OSError) as error:
+                        print("Could not write", len(lines), "games to the journal:", error)
+                if snapshot:
+                    xExperience, oExperience, games = snapshot
+                    try:
+                        writeSnapshot(self.fileName, xExperience, oExperience, games)
+                        trimJournal(self.fileName, games)
+                    except (IOError, OSError) as error:
+                        print("Could not save the experience to", self.fileName + ":", error)
+            finally:
+                with self.condition:
+                    self.busy = False
+                    self.condition.notify_all()
+
+#Global Variables
+X_Experience=ExperienceStore()  #This is the list of boards after X's move with votes showing how good each board situation is
+O_Experience=ExperienceStore()  #This is the list of boards after O's move with votes showing how good each board situation is
+gameCount=0                 #How many games have been played? (how experienced is the computer?)
@@ -0,0 +1,357 @@
+#
+#   Noughts and Crosses Game Server
+#   ===============================
+#
+#   Runs many games at once in one process, all learning into the same
+#   experience (gameFunctions.X_Experience and O_Experience), using asyncio.
+#
+#   Each game "session" has its own board and turn, and a player to get the
+#   human's moves from:
+#       keyboard - this terminal (--keyboard)
+#       socket   - anyone who connects to the server, one session per connection
+#                  (eg: "nc localhost 8765" or "nc -U /tmp/noughts.sock")
+#       vision   - a uArm with a webcam, as in Noughts_and_Crosses_with_Vision.py
+#                  (--vision PORT CAMERA, needs opencv)
+#   A keyboard session can also have a uArm to draw on paper (--arm PORT).
+#
+#   Choosing the computer's move is quick, so it's done straight away on the
+#   event loop. Anything that blocks (the keyboard, the serial port, the webcam)
+#   runs in a thread: one thread per robot (armController.Arm), so its commands
+#   stay in order while the other games carry on. When a game finishes,
+#   learnFromGame, the game count and the journal are updated together under
+#   experienceLock, so games finishing at the same time are learnt one after
+#   the other.
+#
+#   The games' spans (traceFunctions) all go into the same rolling windows, as
+#   there is no telling which game a span (eg: a g-code command) belongs to:
+#   per-game times are turned off, and the rolling times are logged as each
+#   game finishes.
+#
+#   eg:  python3 gameServer.py --port 8765
+#        python3 gameServer.py --keyboard --arm /dev/ttyACM0 --unix /tmp/noughts.sock
+#        python3 gameServer.py --vision /dev/ttyACM0 0 --vision /dev/ttyACM1 1
+#
+#   The socket protocol is lines of text: the server sends the boards and
+#   messages, and a line starting "MOVE X" or "MOVE O" when it wants a move.
+#   The client answers with the square (0-8), or "quit".
+
+import argparse     #for the command line options
+import asyncio      #for running lots of games at once
+import atexit       #to finish saving the experience when the program stops
+import collections  #gamelist needs to be an ordered dictionary
+import gameFunctions     #library of game rules and learning (the game engine)
+import traceFunctions    #for logging the latency of the games
+
+experienceLock = asyncio.Lock()     #learnFromGame, gameCount and the journal are updated one game at a time
+experienceWriter = None             #gameFunctions.ExperienceWriter, made in main()
+
+def boardText(brd):
+    """ Returns the board as printBrd shows it (a string of lines) """
+    brd = gameFunctions.brdToStr(brd) if not isinstance(brd, str) else brd
+    rows = [brd[0] + "|" + brd[1] + "|" + brd[2], brd[3] + "|" + brd[4] + "|" + brd[5], brd[6] + "|" + brd[7] + "|" + brd[8]]
+    return "\n-----\n".join(rows) + "\n"
+
+def parseMove(brd, text):
+    """ Returns the square for a move typed as text, or None if it isn't a legal move """
+    text = text.strip()
+    if not text or not text[0].isdigit():
+        return None
+    move = int(text[0])
+    if move > 8 or gameFunctions.squareAt(brd, move) != " ":
+        return None
+    return move
+
+# =========
+# PLAYERS
+# =========
+#
+#   A player gets the human's moves for a session:
+#       await newGame()     - get ready for a new game (eg: find the new grid)
+#       await show(text)    - show a message (and the board)
+#       await getMove(brd)  - returns the square the human played, or None if they have gone
+
+class SocketPlayer:
+    """ A human connected over a TCP or Unix socket """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def newGame(self):
+        pass
+
+    async def show(self, text):
+        self.writer.write(text.encode("utf-8"))
+        await self.writer.drain()
+
+    async def getMove(self, brd):
+        while True:
+            await self.show("MOVE " + gameFunctions.nextPlayer(brd) + " (0-8):\n")
+            line = await self.reader.readline()
+            if not line or line.strip().lower() == b"quit":
+                return None
+            move = parseMove(brd, line.decode("utf-8", "replace"))
+            if move is not None:
+                return move
+            await self.show("Invalid move - enter a move between 0 and 8:\n" + boardText("012345678"))
+
+    def close(self):
+        self.writer.close()
+
+class KeyboardPlayer:
+    """ The human at this terminal (input() runs in a thread so the other games carry on) """
+
+    async def newGame(self):
+        pass
+
+    async def show(self, text):
+        print(text, end="")
+
+    async def getMove(self, brd):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                text = await loop.run_in_executor(None, input, "You are " + gameFunctions.nextPlayer(brd) + ". What is your move? (0-8): ")
+            except EOFError:
+                return None
+            if text.strip() == "quit":
+                return None
+            move = parseMove(brd, text)
+            if move is not None:
+                return move
+            print("Invalid move - enter a move between 0 and 8:")
+            print(boardText("012345678"))
+
+    def close(self):
+        pass
+
+class VisionPlayer:
+    """ A human playing on paper in front of a robot's webcam """
+
+    #(row, col) from computerVisionFunctions.checkPlayerMove -> square
+    SQUARES = {(row, col): 8 - ((row - 1) * 3 + col - 1) for row in (1, 2, 3) for col in (1, 2, 3)}
+
+    def __init__(self, robot, camera):
+        import computerVisionFunctions      #only needed (with opencv) for vision sessions
+        import cv2
+        import uArmFunctions
+        self.vision = computerVisionFunctions
+        self.uArmFunctions = uArmFunctions
+        self.robot = robot
+        self.video = cv2.VideoCapture(camera)
+        self.boardLines = None
+
+    def findBoard(self):
+        """ Looks for the drawn grid (runs on the robot's thread) """
+        self.uArmFunctions.goVision(self.robot.arm.uArm)
+        for attempt in range(2):
+            self.vision.refreshWebcam(self.video)
+            frame = self.vision.waitForSteadyCamera(self.video)     #as soon as the camera has stopped shaking
+            isGameboard, self.boardLines = self.vision.detect_gameboard(frame)
+            if isGameboard:
+                return True
+        return False
+
+    def watchMove(self, brd):
+        """ Waits for the human to draw a legal move (runs on the robot's thread) """
+        while True:
+            self.uArmFunctions.goVision(self.robot.arm.uArm)
+            self.vision.refreshWebcam(self.video)
+            self.vision.waitForSteadyCamera(self.video)
+            _, originalImage = self.video.read()
+            movePlayed, row, col = self.vision.checkPlayerMove(self.video, self.boardLines, originalImage)
+            if movePlayed:
+                move = self.SQUARES.get((row, col))
+                if move is not None and gameFunctions.squareAt(brd, move) == " ":
+                    return move
+
+    async def show(self, text):
+        print("[" + self.robot.port + "]", text, end="")
+
+    async def newGame(self):
+        self.boardLines = None
+
+    async def getMove(self, brd):
+        if self.boardLines is None and not await self.robot.run(self.findBoard):
+            print("Gameboard could not be detected by camera on", self.robot.port)
+            return None
+        return await self.robot.run(self.watchMove, brd)
+
+    def close(self):
+        self.video.release()
+
+# ========
+# ROBOTS
+# ========
+
+class Robot:
+    """ A uArm driven by armController.Arm (its own thread and command queue), so its (blocking)
+        serial commands run in order without holding up other games
+    """
+
+    def __init__(self, port):
+        import armController                #only needed (with pyserial) when there is a robot
+        self.port = port
+        self.arm = armController.Arm(port)
+
+    async def run(self, func, *args):
+        """ Runs func(*args) on the robot's thread """
+        return await asyncio.wrap_future(self.arm.submit(func, *args))
+
+    async def open(self):
+        await asyncio.wrap_future(self.arm.opened)
+
+    async def drawGrid(self):
+        await asyncio.wrap_future(self.arm.goHome())
+        await asyncio.wrap_future(self.arm.drawBoard())
+
+    async def drawMove(self, player, square):
+        if player == "X":
+            await asyncio.wrap_future(self.arm.drawCross(square))
+        else:
+            await asyncio.wrap_future(self.arm.drawNought(square))
+
+    async def drawWinLine(self, winLine):
+        await asyncio.wrap_future(self.arm.drawWinLine(winLine))
+
+# ==========
+# SESSIONS
+# ==========
+
+class GameSession:
+    """ One table: plays games against a player until they go, taking turns to go first """
+
+    def __init__(self, name, player, robot=None):
+        self.name = name
+        self.player = player
+        self.robot = robot
+        self.computerGoesFirst = False
+
+    async def playGame(self):
+        """ Plays one game, learns from it and returns the result ('X', 'O' or 'D'), or None if the player went """
+        board = gameFunctions.EMPTY_BOARD
+        GameList = collections.OrderedDict()
+        computersTurn = self.computerGoesFirst
+
+        if self.robot:
+            await self.robot.drawGrid()
+        await self.player.newGame()
+        await self.player.show("\n" + boardText("012345678"))
+        if computersTurn:
+            await self.player.show("\nStep aside human, I'm going first!\n")
+        else:
+            await self.player.show("\nYou can go first\n")
+
+        while True:
+            previousBoard = board
+            if computersTurn:
+                board = gameFunctions.findBestMove(board)
+                await self.player.show(boardText(board))
+                if self.robot:
+                    square = gameFunctions.moveSquare(previousBoard, board)
+                    await self.robot.drawMove(gameFunctions.squareAt(board, square), square)
+            else:
+                move = await self.player.getMove(board)
+                if move is None:
+                    return None
+                board = gameFunctions.makeMove(board, move)
+            computersTurn = not computersTurn
+
+            GameList[gameFunctions.rootBoard(board)] = 0
+            gameResult, winLine = gameFunctions.checkWin(board, gameFunctions.moveSquare(previousBoard, board))
+            if gameResult != "N":
+                break
+
+        if gameResult == "D":
+            await self.player.show("\nThe game was a draw\n")
+        else:
+            if self.robot:
+                await self.robot.drawWinLine(winLine)
+            await self.player.show("\n" + boardText(board) + gameResult + " wins!\n")
+
+        async with experienceLock:
+            gameFunctions.learnFromGame(GameList)
+            gameFunctions.gameCount = gameFunctions.gameCount + 1
+            experienceWriter.journal(GameList, gameResult)
+            games = gameFunctions.gameCount
+        traceFunctions.endGame(games, show=False)
+        await self.player.show("Game Count = " + str(games) + "\n")
+        return gameResult
+
+    async def run(self):
+        print("Session", self.name, "started")
+        try:
+            if self.robot:
+                await self.robot.open()
+            while await self.playGame() is not None:
+                self.computerGoesFirst = not self.computerGoesFirst
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.player.close()
+            print("Session", self.name, "finished")
+
+async def serveSockets(port=None, unixPath=None):
+    """ Starts servers that give every connection its own session, returns the servers """
+    connections = 0
+
+    async def newConnection(reader, writer):
+        nonlocal connections
+        connections = connections + 1
+        await GameSession("socket " + str(connections), SocketPlayer(reader, writer)).run()
+
+    servers = []
+    if port:
+        servers.append(await asyncio.start_server(newConnection, "127.0.0.1", port))
+        print("Listening on port", port)
+    if unixPath:
+        servers.append(await asyncio.start_unix_server(newConnection, unixPath))
+        print("Listening on", unixPath)
+    return servers
+
+async def serve(args):
+    servers = await serveSockets(args.port, args.unix)
+    sessions = []
+    if args.keyboard:
+        robot = Robot(args.arm) if args.arm else None
+        sessions.append(GameSession("keyboard", KeyboardPlayer(), robot).run())
+    for port, camera in args.vision or []:
+        robot = Robot(port)
+        sessions.append(GameSession("vision " + port, VisionPlayer(robot, int(camera)), robot).run())
+
+    if servers:
+        sessions.extend(server.serve_forever() for server in servers)
+    await asyncio.gather(*sessions)
+
+def main():
+    global experienceWriter
+
+    parser = argparse.ArgumentParser(description="Serve lots of noughts and crosses games at once, sharing one experience")
+    parser.add_argument("--port", type=int, help="TCP port (on localhost) for socket players")
+    parser.add_argument("--unix", help="Unix socket path for socket players")
+    parser.add_argument("--keyboard", action="store_true", help="play a game at this terminal too")
+    parser.add_argument("--arm", help="serial port of a uArm to draw the keyboard game (eg: /dev/ttyACM0)")
+    parser.add_argument("--vision", nargs=2, action="append", metavar=("PORT", "CAMERA"),
+                        help="a uArm and webcam (eg: /dev/ttyACM0 0) for a vision game, can be repeated")
+    parser.add_argument("--experience", default="experience.txt", help="experience file (default experience.txt)")
+    parser.add_argument("--gcode-trace", help="record every line sent to and received from the uArms in this file")
+    args = parser.parse_args()
+
+    if not (args.port or args.unix or args.keyboard or args.vision):
+        parser.error("nothing to serve: give --port, --unix, --keyboard or --vision")
+    if args.gcode_trace:
+        import uArmFunctions                #only needed (with pyserial) when there is a robot
+        uArmFunctions.TRACE_FILE = args.gcode_trace
+
+    traceFunctions.GAME_SPANS = False       #the games' spans are mixed together, so only keep the rolling windows
+    gameFunctions.loadExperience(args.experience)
+    experienceWriter = gameFunctions.ExperienceWriter(args.experience)
+    atexit.register(experienceWriter.close)
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#
+#   Noughts and Crosses Experience Merger
+#   =====================================
+#
+#   Merges the experience files from several robots into one. The files are
+#   read a line at a time (text or binary, see gameFunctions.readExperience),
+#   and every board is turned into its root board with rootBoard first, as
+#   older files have boards that aren't root boards. Only the merged votes are
+#   kept in memory (at most one entry per root board), so files with millions
+#   of lines are fine.
+#
+#   A robot's experience file is only a snapshot: the games it has played since
+#   are in the journal next to it (see gameFunctions, GAME JOURNAL). As
+#   loadExperience does, any games in the journal numbered above the snapshot's
+#   Game Count are learnt on top of the file's votes before they are merged.
+#
+#   eg:  python3 mergeExperience.py robot1.txt robot2.txt robot3.bin --output merged.txt
+#        python3 mergeExperience.py experience.txt experience296.txt --policy weighted --output merged.bin
+#
+#   Policies for combining the votes for the same board:
+#       sum      - add up the votes (Game Count is the total of all the files)
+#       weighted - average of the votes, each file weighted by its Game Count
+#                  (Game Count is the total of all the files)
+#       max      - the biggest vote (Game Count is the biggest of all the files)
+#   The output is binary if its name ends in ".bin", otherwise text. It must be
+#   a new file, not a robot's experience file: that has a journal next to it,
+#   which would be replayed on top of the merged votes when it is loaded.
+
+import argparse     #for the command line options
+import collections  #gamelist needs to be an ordered dictionary
+import os           #to check the output isn't one of the inputs
+import gameFunctions     #library of game rules and learning (the game engine)
+
+POLICIES = ("sum", "weighted", "max")
+
+def readExperience(fileName):
+    """ Reads an experience file as loadExperience would see it: yields ("Game Count", None, games) then
+        (player, board, votes) for every board, with any later games in its journal learnt first
+    """
+    journalFile = gameFunctions.journalName(fileName)
+    try:
+        journal = gameFunctions.readJournal(journalFile)
+    except IOError:
+        journal = []
+    if not journal:
+        yield from gameFunctions.readExperience(fileName)
+        return
+
+    #the file has to be in memory to learn from the journal's games (at most one entry per board)
+    experience = {"X": gameFunctions.ExperienceStore(), "O": gameFunctions.ExperienceStore()}
+    games = 0
+    for player, brd, vote in gameFunctions.readExperience(fileName):
+        if player == "Game Count":
+            games = vote
+        else:
+            experience[player][brd] = vote
+
+    newer = [(number, boards) for number, result, boards, line in journal if number > games]
+    if newer:
+        saved = gameFunctions.X_Experience, gameFunctions.O_Experience
+        gameFunctions.X_Experience, gameFunctions.O_Experience = experience["X"], experience["O"]
+        try:
+            for number, boards in newer:
+                gameFunctions.learnFromGame(collections.OrderedDict((brd, 0) for brd in boards))
+        finally:
+            gameFunctions.X_Experience, gameFunctions.O_Experience = saved
+            gameFunctions.compilePolicy()           #learnFromGame updated the policy for the file's votes
+        games = newer[-1][0]
+        print("replayed", len(newer), "games from", journalFile)
+
+    yield "Game Count", None, games
+    for player in ("X", "O"):
+        for brd, vote in experience[player].items():
+            yield player, brd, vote
+
+def mergeExperience(fileNames, policy="sum"):
+    """ Merges experience files, returns (X experience, O experience, Game Count) """
+    votes = {"X": {}, "O": {}}
+    weights = {"X": {}, "O": {}}    #total Game Count behind each board (for "weighted")
+    games = 0
+
+    for fileName in fileNames:
+        fileGames = 0
+        for player, brd, vote in readExperience(fileName):
+            if player == "Game Count":
+                fileGames = vote
+                if policy == "max":
+                    games = max(games, fileGames)
+                else:
+                    games = games + fileGames
+                continue
+
+            root = gameFunctions.rootBoard(brd)
+            merged = votes[player]
+            if policy == "sum":
+                merged[root] = merged.get(root, 0) + vote
+            elif policy == "max":
+                merged[root] = max(merged.get(root, vote), vote)
+            else:
+                weight = max(fileGames, 1)          #a file with no Game Count still counts for something
+                merged[root] = merged.get(root, 0) + vote * weight
+                weights[player][root] = weights[player].get(root, 0) + weight
+
+    if policy == "weighted":
+        for player in votes:
+            for root, total in votes[player].items():
+                votes[player][root] = round(total / weights[player][root])
+
+    return gameFunctions.ExperienceStore(votes["X"]), gameFunctions.ExperienceStore(votes["O"]), games
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge noughts and crosses experience files from several robots")
+    parser.add_argument("inputs", nargs="+", help="experience files to merge (text or binary)")
+    parser.add_argument("--policy", choices=POLICIES, default="sum", help="how to combine votes for the same board (default sum)")
+    parser.add_argument("--output", required=True, help="file to write (binary if it ends in .bin), not one of the inputs")
+    args = parser.parse_args()
+
+    if os.path.abspath(args.output) in (os.path.abspath(fileName) for fileName in args.inputs):
+        parser.error("--output would overwrite an input (" + args.output + "): merge into a new file")
+    if os.path.exists(gameFunctions.journalName(args.output)):
+        parser.error("--output has a game journal next to it (" + gameFunctions.journalName(args.output) + "): merge into a new file")
+
+    xExperience, oExperience, games = mergeExperience(args.inputs, args.policy)
+    gameFunctions.writeSnapshot(args.output, xExperience, oExperience, games)
+    print("Merged", len(args.inputs), "files into", args.output, "(" + args.policy + "):",
+          len(xExperience), "X boards,", len(oExperience), "O boards, Game Count =", games)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#
+#   Noughts and Crosses Policy Table
+#   ================================
+#
+#   Dumps the compiled policy (the best move from every root board, see
+#   gameFunctions.py) to a file, or loads a policy file and shows it.
+#
+#   eg:  python3 policyTable.py dump --experience experience296.txt --output policy.txt
+#        python3 policyTable.py load policy.txt
+#
+#   Each line of a policy file is:   board : best squares : votes
+#   eg:  "X O       : 7 : 12" means with X in square 0 and O in square 2,
+#        X's best move is square 7, which has 12 votes.
+#   Boards that aren't in the file have no move with more than 0 votes, so the
+#   computer plays them randomly.
+
+import argparse     #for the command line options
+import gameFunctions     #library of game rules and learning (the game engine)
+
+def dumpPolicy(experienceFile, policyFile):
+    """ Compiles the policy from an experience file and saves it """
+    gameFunctions.loadExperience(experienceFile)
+    gameFunctions.savePolicy(policyFile)
+    known = sum(1 for squares in gameFunctions.POLICY_MOVES if squares)
+    print("Saved policy for", known, "of", len(gameFunctions.ROOTS), "root boards to", policyFile)
+
+def showPolicy(policyFile):
+    """ Loads a policy file and prints every board that has a best move """
+    gameFunctions.loadPolicy(policyFile)
+    for index, root in enumerate(gameFunctions.ROOTS):
+        squares = gameFunctions.POLICY_MOVES[index]
+        if squares:
+            print(gameFunctions.nextPlayer(root), "to move, best squares", squares, "with",
+                  gameFunctions.POLICY_VOTES[index], "votes:")
+            gameFunctions.printBrd(root)
+            print("")
+
+def main():
+    parser = argparse.ArgumentParser(description="Dump or load the compiled noughts and crosses policy")
+    commands = parser.add_subparsers(dest="command", required=True)
+    dump = commands.add_parser("dump", help="compile the policy from an experience file and save it")
+    dump.add_argument("--experience", default="experience.txt", help="experience file (default experience.txt)")
+    dump.add_argument("--output", default="policy.txt", help="policy file to write (default policy.txt)")
+    load = commands.add_parser("load", help="load a policy file and show it")
+    load.add_argument("policy", nargs="?", default="policy.txt", help="policy file to read (default policy.txt)")
+    args = parser.parse_args()
+
+    if args.command == "dump":
+        dumpPolicy(args.experience, args.output)
+    else:
+        showPolicy(args.policy)
+
+if __name__ == "__main__":
+    main()
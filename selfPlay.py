@@ -0,0 +1,189 @@
+#
+#   Noughts and Crosses Self-Play Training
+#   ======================================
+#
+#   Trains the experience lists without a robot, camera or keyboard by letting
+#   the computer play against itself (or against a "random" or "perfect"
+#   opponent) as fast as it can, then saving the experience at the end.
+#
+#   eg:  python3 selfPlay.py --games 5000
+#        python3 selfPlay.py --games 2000 --x self --o perfect --alternate
+#        python3 selfPlay.py --experience experience296.txt --output trained.txt
+#        python3 selfPlay.py --games 1000000 --workers 0      (one process per core)
+#
+#   Player types:
+#       self    - findBestMove, using (and learning into) the experience lists
+#       random  - any legal move
+#       perfect - never loses (minimax), picks randomly between equally good moves
+#
+#   With --workers the games are shared out across a pool of processes. Every
+#   "round" each worker starts from a copy of the master experience, plays its
+#   share of --sync-games games learning into its own copy, and sends back just
+#   the vote changes. The master adds the changes in worker order, so a run with
+#   the same --seed and --workers always gives the same experience. (The votes
+#   learnFromGame gives for draws are "set to 1" rather than "add", so two
+#   workers finding the same new drawn board in one round will give it 2.)
+
+import argparse     #for the command line options
+import collections  #gamelist needs to be an ordered dictionary
+import multiprocessing  #for playing games on every core
+import random       #for choosing random moves
+import time         #for timing the games
+import gameFunctions     #library of game rules and learning (the game engine)
+
+def randomMove(brd):
+    """ Returns the board after a random legal move """
+    return random.choice(gameFunctions.nextMoves(brd))
+
+def perfectResult(brd):
+    """ Returns the result of the game ('X', 'O' or 'D') if both players play perfectly from 'brd'
+        Results are remembered by root board, so each of the 765 root boards is only solved once
+    """
+    root = gameFunctions.rootBoard(brd)
+    if root in perfectResults:
+        return perfectResults[root]
+
+    result = gameFunctions.checkWin(brd)[0]
+    if result == "N":
+        player = gameFunctions.nextPlayer(brd)
+        results = [perfectResult(m) for m in gameFunctions.nextMoves(brd)]
+        if player in results:
+            result = player
+        elif "D" in results:
+            result = "D"
+        else:
+            result = results[0]
+    perfectResults[root] = result
+    return result
+
+def perfectMove(brd):
+    """ Returns the board after a move that gives the best possible result, chosen randomly if there are several """
+    player = gameFunctions.nextPlayer(brd)
+    moves = gameFunctions.nextMoves(brd)
+    for best in (player, "D"):
+        bestMoves = [m for m in moves if perfectResult(m) == best]
+        if bestMoves:
+            return random.choice(bestMoves)
+    return random.choice(moves)
+
+perfectResults = {}         #root board -> result with perfect play (filled in as needed)
+
+PLAYERS = {
+    "self": gameFunctions.findBestMove,
+    "random": randomMove,
+    "perfect": perfectMove,
+}
+
+def playGame(xPlayer, oPlayer):
+    """ Plays one game between two move functions, learns from it and returns the result ('X', 'O' or 'D') """
+    board = gameFunctions.EMPTY_BOARD
+    GameList = collections.OrderedDict()
+    player = xPlayer
+    while True:
+        board = player(board)
+        GameList[gameFunctions.rootBoard(board)] = 0        #record the move (for learning later)
+        result = gameFunctions.checkWin(board)[0]
+        if result != "N":
+            break
+        if player is xPlayer:
+            player = oPlayer
+        else:
+            player = xPlayer
+
+    gameFunctions.learnFromGame(GameList)                   #remember all the moves from the game for next time!
+    return result
+
+def selfPlay(games, xPlayer, oPlayer, alternate=False):
+    """ Plays 'games' games, learning from each one
+        If 'alternate' is True the two players swap between X and O every game
+        Returns a Counter of the results
+    """
+    results = collections.Counter()
+    for n in range(games):
+        if alternate and n % 2:
+            results[playGame(oPlayer, xPlayer)] += 1
+        else:
+            results[playGame(xPlayer, oPlayer)] += 1
+    gameFunctions.gameCount = gameFunctions.gameCount + games
+    return results
+
+def playShard(task):
+    """ Runs in a worker process: plays a share of the games starting from a copy of the master experience
+        Returns the X and O vote changes and the results
+    """
+    X_Experience, O_Experience, games, xPlayer, oPlayer, alternate, seed = task
+    random.seed(seed)
+    gameFunctions.X_Experience = X_Experience.copy()
+    gameFunctions.O_Experience = O_Experience.copy()
+    gameFunctions.compilePolicy()
+    results = selfPlay(games, xPlayer, oPlayer, alternate)
+    return (gameFunctions.experienceDelta(X_Experience, gameFunctions.X_Experience),
+            gameFunctions.experienceDelta(O_Experience, gameFunctions.O_Experience),
+            results)
+
+def parallelSelfPlay(games, xPlayer, oPlayer, alternate=False, workers=None, syncGames=500, seed=None):
+    """ Plays 'games' games shared out across 'workers' processes (default: one per core)
+        Each worker plays up to 'syncGames' games between merges into the master experience
+        Returns a Counter of the results
+    """
+    workers = workers or multiprocessing.cpu_count()
+    seeds = random.Random(seed)
+    results = collections.Counter()
+    played = 0
+
+    with multiprocessing.Pool(workers) as pool:
+        while played < games:
+            roundGames = min(games - played, workers * syncGames)
+            tasks = []
+            for w in range(workers):
+                shardGames = roundGames // workers + (1 if w < roundGames % workers else 0)
+                if shardGames:
+                    tasks.append((gameFunctions.X_Experience, gameFunctions.O_Experience, shardGames,
+                                  xPlayer, oPlayer, alternate, seeds.randrange(2 ** 32)))
+
+            #merge in worker order so the result doesn't depend on which worker finishes first
+            for xDelta, oDelta, shardResults in pool.map(playShard, tasks):
+                gameFunctions.addExperience(gameFunctions.X_Experience, xDelta)
+                gameFunctions.addExperience(gameFunctions.O_Experience, oDelta)
+                results.update(shardResults)
+            played = played + roundGames
+
+    gameFunctions.compilePolicy()
+    gameFunctions.gameCount = gameFunctions.gameCount + games
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the noughts and crosses experience by self-play")
+    parser.add_argument("--games", type=int, default=1000, help="number of games to play (default 1000)")
+    parser.add_argument("--x", choices=PLAYERS, default="self", help="who plays X (default self)")
+    parser.add_argument("--o", choices=PLAYERS, default="self", help="who plays O (default self)")
+    parser.add_argument("--alternate", action="store_true", help="swap the players between X and O every game")
+    parser.add_argument("--experience", default="experience.txt", help="experience file to start from (default experience.txt)")
+    parser.add_argument("--output", help="file to save the experience to (default: the --experience file)")
+    parser.add_argument("--seed", type=int, help="random seed, for repeatable runs")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes to play on (0 = one per core, default 1)")
+    parser.add_argument("--sync-games", type=int, default=500, help="games each worker plays between merges (default 500)")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    gameFunctions.loadExperience(args.experience)
+
+    print("Playing", args.games, "games:", args.x, "(X) v", args.o, "(O)", "alternating" if args.alternate else "")
+    startTime = time.perf_counter()
+    if args.workers == 1:
+        results = selfPlay(args.games, PLAYERS[args.x], PLAYERS[args.o], args.alternate)
+    else:
+        results = parallelSelfPlay(args.games, PLAYERS[args.x], PLAYERS[args.o], args.alternate,
+                                   args.workers, args.sync_games, args.seed)
+    elapsed = time.perf_counter() - startTime
+
+    print("X wins:", results["X"], " O wins:", results["O"], " Draws:", results["D"])
+    print("%d games in %.2f s (%.0f games per second)" % (args.games, elapsed, args.games / max(elapsed, 1e-9)))
+    print("Game Count = ", gameFunctions.gameCount)
+
+    gameFunctions.saveExperience(args.output or args.experience)
+
+if __name__ == "__main__":
+    main()
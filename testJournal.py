@@ -0,0 +1,67 @@
+#
+#   Game Journal Tests
+#   ==================
+#
+#   Checks that a journal left with a half written game (the program stopped
+#   while writing it) still takes the next games, and that they are all
+#   replayed when the experience is loaded again.
+#
+#   eg:  python3 -m unittest testJournal
+
+import collections  #gamelist needs to be an ordered dictionary
+import contextlib   #for hiding the engine's "loading experience" messages
+import io           #somewhere to send those messages
+import os           #for the temporary experience files
+import shutil       #to copy the shipped experience
+import tempfile     #for the temporary experience files
+import unittest
+import gameFunctions     #library of game rules and learning (the game engine)
+
+def playGame():
+    """ Returns a game (an ordered dictionary of root boards) of the computer against itself """
+    board = gameFunctions.EMPTY_BOARD
+    Game = collections.OrderedDict()
+    while True:
+        board = gameFunctions.findBestMove(board)
+        Game[gameFunctions.rootBoard(board)] = 0
+        if gameFunctions.checkWin(board)[0] != "N":
+            return Game
+
+def load(fileName):
+    with contextlib.redirect_stdout(io.StringIO()):
+        gameFunctions.loadExperience(fileName)
+
+class TornJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.fileName = os.path.join(self.tempDir.name, "experience.txt")
+        shutil.copy("experience296.txt", self.fileName)
+        load(self.fileName)
+        self.games = gameFunctions.gameCount
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def test_append_after_torn_line(self):
+        journalFile = gameFunctions.journalName(self.fileName)
+        Game = playGame()
+        gameFunctions.gameCount = self.games + 1
+        whole = gameFunctions.journalLine(Game, "D")
+        with open(journalFile, "w") as journal:
+            journal.write(whole + whole[:20])           #the second game was cut off half written
+
+        writer = gameFunctions.ExperienceWriter(self.fileName)
+        gameFunctions.gameCount = self.games + 2
+        writer.journal(Game, "D")
+        writer.flush()
+
+        with open(journalFile, "r") as journal:
+            lines = journal.readlines()
+        self.assertEqual([line.split(":")[0] for line in lines], [str(self.games + 1), str(self.games + 2)])
+        load(self.fileName)
+        self.assertEqual(gameFunctions.gameCount, self.games + 2)
+        writer.close()
+
+if __name__ == "__main__":
+    unittest.main()
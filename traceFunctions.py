@@ -0,0 +1,129 @@
+#
+#   Noughts and Crosses Latency Tracing
+#   ===================================
+#
+#   Times the phases of each turn (thinking, drawing, every G-code command,
+#   the webcam) so a slow turn can be traced to what was slow.
+#
+#   Wrap code in a span, or a whole function with the traced decorator:
+#
+#       with traceFunctions.span("think"):
+#           board = gameFunctions.findBestMove(board)
+#
+#       @traceFunctions.traced("drawNought")
+#       def drawNought(uArm, whichSquare): ...
+#
+#   Each span's time is kept twice in memory: for the current game, and in a
+#   rolling window of the last ROLLING_SPANS times for that name. endGame()
+#   prints the p50/p95/p99 of both, appends them to LOG_FILE as one JSON line,
+#   and starts the next game. Recording a span is just a perf_counter() call and
+#   two appends, so it can be left on all the time (set ENABLED=False to stop it).
+#   Spans can be recorded from any thread (eg: the arm's and the serial reader's).
+#   A program playing several games at once (gameServer.py) can't tell which
+#   game a span belongs to, so it sets GAME_SPANS=False: only the rolling
+#   windows are kept, and endGame just reports those.
+
+import collections  #the rolling windows are deques
+import functools    #for the traced decorator
+import json         #for the latency log
+import threading    #spans are recorded from several threads
+import time         #for timing the spans
+
+ENABLED = True              #record spans?
+GAME_SPANS = True           #keep each game's times as well as the rolling windows? (only if one game is played at a time)
+ROLLING_SPANS = 1000        #how many of the latest times to keep for each span name
+LOG_FILE = "latency.log"    #one JSON line per game (None for no log)
+
+rollingTimes = {}           #span name -> deque of the latest times (seconds)
+gameTimes = {}              #span name -> list of this game's times (seconds)
+timesLock = threading.Lock()    #for rollingTimes and gameTimes
+
+def record(name, seconds):
+    """ Records one time for the span 'name' """
+    if not ENABLED:
+        return
+    with timesLock:
+        times = rollingTimes.get(name)
+        if times is None:
+            times = rollingTimes[name] = collections.deque(maxlen=ROLLING_SPANS)
+        times.append(seconds)
+        if GAME_SPANS:
+            gameTimes.setdefault(name, []).append(seconds)
+
+class span:
+    """ Times the code inside a 'with' block and records it under 'name' """
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+def traced(name=None):
+    """ Decorator that times every call of a function (as 'name', default the function's name) """
+    def decorate(func):
+        spanName = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(spanName, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+def percentiles(times):
+    """ Returns the (p50, p95, p99) of a list of times, nearest rank """
+    ordered = sorted(times)
+    last = len(ordered) - 1
+    return tuple(ordered[int(round(p * last))] for p in (0.50, 0.95, 0.99))
+
+def summarise(timesByName):
+    """ Returns {name: {"count", "total", "p50", "p95", "p99"}} in milliseconds """
+    summary = {}
+    for name, times in list(timesByName.items()):
+        times = list(times)
+        if times:
+            p50, p95, p99 = percentiles(times)
+            summary[name] = {"count": len(times), "total": sum(times) * 1000,
+                             "p50": p50 * 1000, "p95": p95 * 1000, "p99": p99 * 1000}
+    return summary
+
+def printSummary(title, summary):
+    print(title)
+    print("    %-18s %6s %10s %9s %9s %9s" % ("span", "count", "total ms", "p50 ms", "p95 ms", "p99 ms"))
+    for name in sorted(summary):
+        s = summary[name]
+        print("    %-18s %6d %10.1f %9.2f %9.2f %9.2f" % (name, s["count"], s["total"], s["p50"], s["p95"], s["p99"]))
+
+def endGame(gameNumber=None, show=True):
+    """ Reports this game's and the rolling span times, logs them, and starts timing a new game
+        Returns the report (a dictionary)
+    """
+    global gameTimes
+
+    with timesLock:
+        thisGame, gameTimes = gameTimes, {}
+        rolling = {name: list(times) for name, times in rollingTimes.items()}
+    report = {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "game": gameNumber,
+        "game spans": summarise(thisGame),
+        "rolling spans": summarise(rolling),
+    }
+
+    if show and report["game spans"]:
+        printSummary("Timings for this game:", report["game spans"])
+        printSummary("Timings for the last " + str(ROLLING_SPANS) + " of each:", report["rolling spans"])
+    if LOG_FILE and ENABLED:
+        with open(LOG_FILE, "a") as logFile:
+            logFile.write(json.dumps(report) + "\n")
+    return report
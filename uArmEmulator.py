@@ -0,0 +1,425 @@
+#
+#   uArm Emulator
+#   =============
+#
+#   A stand-in for a uArm on a pseudo-terminal (pty), so uArmFunctions and
+#   everything built on it (the games, armController, gameServer) can run
+#   without a robot:
+#
+#       python3 uArmEmulator.py --link /tmp/uArm --trajectory pen.json
+#       python3 gameServer.py --keyboard --arm /tmp/uArm
+#
+#   It speaks the uArm's g-code dialect as sendGCode and GCodeStream use it:
+#       - the boot banner (BANNER) a moment after the port is opened, as a uArm
+#         restarts whenever its USB serial port is opened
+#       - G0 and G1 moves (X Y Z in mm, F in mm/min; the feed rate carries on
+#         to later moves until another F)
+#       - G2 and G3 arcs, clockwise and anticlockwise (X Y to where the arc ends,
+#         I J from where it starts to its centre; a full circle if it ends where
+#         it starts)
+#       - G90 (absolute) and G91 (relative) coordinates
+#       - P2201, P2202 and P2203 (device name and versions), P2220 (where the arm
+#         is), M2200 (is the arm moving: V0, as replies only come once it has stopped)
+#       - a reply to each command once it has been done: "ok", or "$12 ok" for
+#         a numbered command ("#12 G0 ..."), or an error instead of ok: E20
+#         (unknown command), E21 (bad parameter) or E22 (out of reach)
+#
+#   Commands are done one after the other, as they arrive. How long a move
+#   takes comes from a kinematic model (Kinematics): the arm speeds up to the
+#   feed rate (no faster than maxFeed) at 'acceleration', cruises, and slows to
+#   a stop, so short moves never reach full speed. Every move is recorded in the
+#   trajectory (from where to where, how far, when, and whether the pen was drawing).
+#
+#   unplug() (or --unplug-every) pulls the emulated USB cable out for a moment,
+#   to try out reconnecting: the port comes back as a new pseudo-terminal, so
+#   open it by its link. The uArm restarts, so any moves it hadn't started are
+#   dropped from the trajectory (and never done), as on a real uArm.
+#
+#   The arm itself (where it is, what each command does, how long it takes) is
+#   an ArmModel, which needs no serial port: estimateTime runs g-code through
+#   one to predict how long a drawing takes without drawing it.
+#
+#   From a program (eg: a benchmark):
+#       emulator = uArmEmulator.UArmEmulator()
+#       uArm = uArmFunctions.openUArm(emulator.start())
+#       ...
+#       emulator.stop()
+#       print(emulator.inkLength(), emulator.motionTime())
+
+import argparse     #for the command line options
+import collections  #for the kinematics and trajectory tuples
+import json         #for saving the trajectory
+import math         #for distances and move times
+import os           #for the pseudo-terminal
+import select       #to wait for commands (or for the port to be opened)
+import threading    #the emulator runs on its own thread
+import time         #for the kinematic model
+import tty          #to put the pseudo-terminal in raw mode (no echo)
+
+Kinematics = collections.namedtuple("Kinematics", "feed maxFeed acceleration commandTime latency bootTime")
+
+KINEMATICS = Kinematics(
+    feed=3000,              #feed rate before any F is given (mm/min)
+    maxFeed=12000,          #fastest the arm will move, whatever F says (mm/min)
+    acceleration=1500,      #mm/s/s, speeding up and slowing down
+    commandTime=0.002,      #time to read and plan each command (s)
+    latency=0.001,          #USB serial delay for each reply (s)
+    bootTime=1.0,           #from the port being opened to the banner (s)
+)
+
+BANNER = ("@1", "@5 V1")    #sent when the uArm has started (ready, power connected)
+HOME = (150.0, 0.0, 10.0)   #where the arm is when the emulator starts
+REACH = (50.0, 360.0)       #nearest and furthest the pen can be from the base (mm, in X-Y)
+HEIGHT = (-150.0, 160.0)    #lowest and highest the pen can go (mm)
+PEN_DOWN_Z = 0.5            #the pen is on the paper at or below this height
+ARC_TOLERANCE = 0.05        #how much the distances from an arc's centre to its two ends can differ (mm)
+
+INFO = {
+    "P2201": "ok VuArm Emulator",
+    "P2202": "ok V3.3.1",
+    "P2203": "ok V4.0.0",
+}
+
+Segment = collections.namedtuple("Segment", "start end fromPoint toPoint length drawing gCode")
+
+def splitNumber(line):
+    """ Returns (command number, g-code) for a line such as "#12 G0 X150", (None, g-code) if it has no number """
+    if line.startswith("#"):
+        word, _, gCode = line.partition(" ")
+        if word[1:].isdigit():
+            return int(word[1:]), gCode.strip()
+    return None, line.strip()
+
+def arcLength(fromPoint, toPoint, centre, clockwise):
+    """ Returns how far the pen goes along an arc (a helix if Z changes too),
+        or None if the ends aren't the same distance from the centre
+    """
+    radius = math.hypot(fromPoint[0] - centre[0], fromPoint[1] - centre[1])
+    if radius < ARC_TOLERANCE or abs(math.hypot(toPoint[0] - centre[0], toPoint[1] - centre[1]) - radius) > ARC_TOLERANCE:
+        return None
+    startAngle = math.atan2(fromPoint[1] - centre[1], fromPoint[0] - centre[0])
+    endAngle = math.atan2(toPoint[1] - centre[1], toPoint[0] - centre[0])
+    sweep = (startAngle - endAngle if clockwise else endAngle - startAngle) % (2 * math.pi)
+    if sweep < 1e-9:
+        sweep = 2 * math.pi                     #ends where it starts: a full circle
+    return math.hypot(radius * sweep, toPoint[2] - fromPoint[2])
+
+def moveTime(distance, speed, acceleration):
+    """ Returns how long a move of 'distance' (mm) takes (s): speeding up to 'speed' (mm/s),
+        cruising, then slowing to a stop (it never reaches 'speed' if the move is short)
+    """
+    if distance <= 0:
+        return 0.0
+    if acceleration <= 0:
+        return distance / speed
+    if distance >= speed * speed / acceleration:
+        return distance / speed + speed / acceleration
+    return 2 * math.sqrt(distance / acceleration)
+
+class ArmModel:
+    """ A uArm's position and g-code, with how long each command takes (Kinematics)
+            perform(gCode, now) - do a command as soon as the ones before it are done, returns the reply
+            busyUntil           - when every command so far will have been done
+            trajectory          - every move done, as Segments
+            save(file)          - save the trajectory as JSON
+    """
+
+    def __init__(self, kinematics=KINEMATICS, position=HOME):
+        self.kinematics = kinematics
+        self.position = position
+        self.absolute = True
+        self.feed = kinematics.feed
+        self.trajectory = []
+        self.busyUntil = 0.0
+
+    def perform(self, gCode, now=0.0):
+        start = max(now, self.busyUntil) + self.kinematics.commandTime
+        result, duration = self.execute(gCode, start)
+        self.busyUntil = start + duration
+        return result
+
+    # ========
+    # G-CODE
+    # ========
+
+    def execute(self, gCode, start):
+        """ Does one command starting at 'start', returns (reply, how long it took) """
+        words = gCode.split()
+        if not words:
+            return "E20", 0.0
+        code = words[0].upper()
+        values = {}
+        for word in words[1:]:
+            try:
+                values[word[0].upper()] = float(word[1:])
+            except ValueError:
+                return "E21", 0.0
+
+        if code in ("G0", "G1", "G2", "G3"):
+            return self.move(code, values, start, gCode)
+        if code == "G90":
+            self.absolute = True
+            return "ok", 0.0
+        if code == "G91":
+            self.absolute = False
+            return "ok", 0.0
+        if code == "P2220":
+            return "ok X%.2f Y%.2f Z%.2f" % self.position, 0.0
+        if code == "M2200":
+            return "ok V0", 0.0
+        if code in INFO:
+            return INFO[code], 0.0
+        return "E20", 0.0
+
+    def target(self, values):
+        """ Returns where a move's X, Y and Z values take the pen (G90 or G91) """
+        point = []
+        for axis, now in zip("XYZ", self.position):
+            if axis not in values:
+                point.append(now)
+            elif self.absolute:
+                point.append(values[axis])
+            else:
+                point.append(now + values[axis])
+        return tuple(point)
+
+    def reachable(self, point):
+        x, y, z = point
+        return REACH[0] <= math.hypot(x, y) <= REACH[1] and HEIGHT[0] <= z <= HEIGHT[1]
+
+    def move(self, code, values, start, gCode):
+        if "F" in values and values["F"] <= 0:
+            return "E21", 0.0
+        toPoint = self.target(values)
+        if code in ("G2", "G3"):
+            if "I" not in values and "J" not in values:
+                return "E21", 0.0
+            centre = (self.position[0] + values.get("I", 0.0), self.position[1] + values.get("J", 0.0))
+            length = arcLength(self.position, toPoint, centre, code == "G2")
+            if length is None:
+                return "E21", 0.0
+        else:
+            length = math.dist(self.position, toPoint)
+        if not self.reachable(toPoint):
+            return "E22", 0.0
+        if "F" in values:
+            self.feed = values["F"]
+        speed = min(self.feed, self.kinematics.maxFeed) / 60
+        duration = moveTime(length, speed, self.kinematics.acceleration)
+        self.record(start, start + duration, self.position, toPoint, length, gCode)
+        self.position = toPoint
+        return "ok", duration
+
+    # ============
+    # TRAJECTORY
+    # ============
+
+    def abandon(self, now):
+        """ The arm has restarted at 'now': the moves it hadn't started yet are never done (it stays
+            where it got to, finishing the move it was making)
+        """
+        while self.trajectory and self.trajectory[-1].start > now:
+            self.trajectory.pop()
+        if self.trajectory:
+            self.position = self.trajectory[-1].toPoint
+        self.busyUntil = min(self.busyUntil, now)
+
+    def record(self, start, end, fromPoint, toPoint, length, gCode):
+        drawing = fromPoint[2] <= PEN_DOWN_Z and toPoint[2] <= PEN_DOWN_Z
+        self.trajectory.append(Segment(start, end, fromPoint, toPoint, length, drawing, gCode))
+
+    def inkLength(self):
+        """ Returns how far the pen has drawn (mm) """
+        return sum(s.length for s in self.trajectory if s.drawing)
+
+    def travelLength(self):
+        """ Returns how far the pen has moved without drawing (mm) """
+        return sum(s.length for s in self.trajectory if not s.drawing)
+
+    def motionTime(self):
+        """ Returns how long the arm has spent moving (s) """
+        return sum(s.end - s.start for s in self.trajectory)
+
+    def save(self, fileName):
+        """ Saves the trajectory as JSON: a list of moves, times in seconds from the first move """
+        origin = self.trajectory[0].start if self.trajectory else 0.0
+        moves = [{"start": round(s.start - origin, 6), "end": round(s.end - origin, 6),
+                  "from": s.fromPoint, "to": s.toPoint, "length": round(s.length, 3), "drawing": s.drawing, "gcode": s.gCode}
+                 for s in self.trajectory]
+        with open(fileName, "w") as trajectoryFile:
+            json.dump({"kinematics": self.kinematics._asdict(), "moves": moves,
+                       "ink mm": self.inkLength(), "travel mm": self.travelLength(),
+                       "moving s": self.motionTime()}, trajectoryFile, indent=1)
+            trajectoryFile.write("\n")
+
+class UArmEmulator(ArmModel):
+    """ An emulated uArm on a pseudo-terminal
+            start()       - start the emulator thread, returns the port to open (eg: /dev/pts/3)
+            stop()        - stop it and close the pseudo-terminal
+        'link' is a path (eg: /tmp/uArm) to make as a link to the port, for programs that need
+        a port name before the emulator has started.
+    """
+
+    def __init__(self, kinematics=KINEMATICS, link=None, banner=BANNER):
+        ArmModel.__init__(self, kinematics)
+        self.link = link
+        self.banner = banner
+        self.replies = collections.deque()      #(time due, bytes), in the order they are due
+        self.connected = False
+        self.running = False
+        self.thread = None
+        self.plugIn()
+
+    def plugIn(self):
+        """ Makes the pseudo-terminal (and the link to it) """
+        self.master, slave = os.openpty()
+        tty.setraw(slave)                       #no echo, no line editing, like a real serial port
+        self.port = os.ttyname(slave)
+        os.close(slave)                         #so the emulator can tell when a program opens (or closes) the port
+        if self.link:
+            if os.path.islink(self.link):
+                os.remove(self.link)
+            os.symlink(self.port, self.link)
+
+    def unplug(self, downTime=1.0):
+        """ Pulls the USB cable out for downTime seconds: the port goes, then comes back (as a new
+            pseudo-terminal, the link points to it) and the uArm restarts when it is opened
+        """
+        self.stop()
+        if self.connected:
+            self.disconnect()
+        time.sleep(downTime)
+        self.plugIn()
+        self.start()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="uArm emulator " + self.port, daemon=True)
+        self.thread.start()
+        return self.port
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        os.close(self.master)
+        if self.link and os.path.islink(self.link):
+            os.remove(self.link)
+
+    # =============
+    # SERIAL PORT
+    # =============
+
+    def run(self):
+        poller = select.poll()
+        poller.register(self.master, select.POLLIN)
+        buffer = bytearray()
+        while self.running:
+            timeOut = 0.05                      #so stop() is noticed
+            if self.replies:
+                timeOut = min(timeOut, max(0.0, self.replies[0][0] - time.monotonic()))
+            events = poller.poll(timeOut * 1000)
+            hungUp = any(event & (select.POLLHUP | select.POLLERR) for fd, event in events)
+            data = b""
+            if events and not hungUp:
+                try:
+                    data = os.read(self.master, 4096)
+                except OSError:
+                    hungUp = True
+            if hungUp:
+                if self.connected:
+                    self.disconnect()
+                time.sleep(0.01)                #nobody has the port open
+                continue
+            if not self.connected:
+                self.connect()
+
+            buffer += data.replace(b"\r", b"\n")
+            end = buffer.find(b"\n")
+            while end >= 0:
+                line = buffer[:end].decode("utf-8", "replace").strip()
+                del buffer[:end + 1]
+                if line:
+                    self.command(line)
+                end = buffer.find(b"\n")
+            self.sendReplies()
+
+    def connect(self):
+        """ The port has been opened: the uArm restarts, and sends its banner once it is ready """
+        self.connected = True
+        self.replies.clear()
+        self.busyUntil = time.monotonic() + self.kinematics.bootTime
+        for line in self.banner:
+            self.replies.append((self.busyUntil, (line + "\n").encode("utf-8")))
+
+    def disconnect(self):
+        """ The port has been closed: the uArm restarts, so anything not done yet is forgotten """
+        self.connected = False
+        self.replies.clear()
+        self.abandon(time.monotonic())
+
+    def sendReplies(self):
+        now = time.monotonic()
+        while self.replies and self.replies[0][0] <= now:
+            os.write(self.master, self.replies.popleft()[1])
+
+    def command(self, line):
+        """ Does one line of g-code (once the commands before it are done), and queues its reply """
+        number, gCode = splitNumber(line)
+        result = self.perform(gCode, time.monotonic())
+        if number is not None:
+            result = "$" + str(number) + " " + result
+        self.replies.append((self.busyUntil + self.kinematics.latency, (result + "\n").encode("utf-8")))
+
+def estimateTime(gCodes, kinematics=KINEMATICS, position=HOME):
+    """ Returns how long (s) a uArm should take to do a list of g-code commands sent in one go
+        (eg: a drawingFunctions.Program), and the ArmModel that did them (for the trajectory)
+    """
+    model = ArmModel(kinematics, position)
+    for line in gCodes:
+        model.perform(splitNumber(line)[1])
+    return model.busyUntil + kinematics.latency, model
+
+def addKinematicsArguments(parser):
+    """ Adds command line options for each of the Kinematics (see kinematicsFrom) """
+    parser.add_argument("--feed", type=float, default=KINEMATICS.feed, help="feed rate before any F (mm/min, default %(default)g)")
+    parser.add_argument("--max-feed", type=float, default=KINEMATICS.maxFeed, help="fastest feed rate (mm/min, default %(default)g)")
+    parser.add_argument("--acceleration", type=float, default=KINEMATICS.acceleration, help="mm/s/s (default %(default)g, 0 for none)")
+    parser.add_argument("--command-time", type=float, default=KINEMATICS.commandTime, help="time to plan each command (s, default %(default)g)")
+    parser.add_argument("--latency", type=float, default=KINEMATICS.latency, help="serial delay for each reply (s, default %(default)g)")
+    parser.add_argument("--boot-time", type=float, default=KINEMATICS.bootTime, help="time from opening the port to the banner (s, default %(default)g)")
+
+def kinematicsFrom(args):
+    return Kinematics(args.feed, args.max_feed, args.acceleration, args.command_time, args.latency, args.boot_time)
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulate a uArm on a pseudo-terminal")
+    parser.add_argument("--link", help="make a link to the port at this path (eg: /tmp/uArm)")
+    parser.add_argument("--trajectory", help="save the pen's trajectory to this file (JSON) when stopped")
+    parser.add_argument("--unplug-every", type=float, help="pull the USB cable out for a second every this many seconds (needs --link)")
+    addKinematicsArguments(parser)
+    args = parser.parse_args()
+
+    if args.unplug_every and not args.link:
+        parser.error("--unplug-every needs --link (the port changes when it comes back)")
+    emulator = UArmEmulator(kinematicsFrom(args), args.link)
+    print("uArm emulator on", emulator.port + (" (" + args.link + ")" if args.link else ""), "- Ctrl-C to stop")
+    emulator.start()
+    try:
+        while True:
+            if args.unplug_every:
+                time.sleep(args.unplug_every)
+                print("Unplugged")
+                emulator.unplug()
+                print("Plugged in again on", emulator.port)
+            else:
+                time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    emulator.stop()
+    print("Drew %.1f mm, moved %.1f mm without drawing, %.2f s moving" % (emulator.inkLength(), emulator.travelLength(), emulator.motionTime()))
+    if args.trajectory:
+        emulator.save(args.trajectory)
+
+if __name__ == "__main__":
+    main()
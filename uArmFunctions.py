@@ -1,89 +1,547 @@
+import collections  #for the Response tuple
+import drawingFunctions  #the strokes for the board, noughts, crosses and win lines
+import json         #for the g-code trace
+import queue        #lines read from the uArm are queued for whoever is waiting
 import serial
+import threading    #a reader thread for each serial port
 import time
+import traceFunctions     #for timing each command and drawing
+
+#==============================================================
+#   CONNECTING
+#==============================================================
+#
+#   A uArm restarts when its serial port is opened, and says "@1" when it is
+#   ready. openUArm waits for that (or, if it hasn't come after PROBE_AFTER
+#   seconds, eg: the uArm didn't restart, asks where the arm is with P2220
+#   until it answers) and returns as soon as the uArm is ready, once the rest
+#   of its start-up messages have arrived.
+#
+#   If the port drops (eg: the USB cable is knocked out and back in), the next
+#   command reopens it with reconnectUArm, waits for the uArm to be ready again
+#   and carries on. Commands that were waiting for a reply when it dropped are
+#   lost, and the uArm has restarted part way through them: a GCodeStream counts
+#   them as errors and sends nothing more until its barrier (so the rest of a
+#   drawing isn't drawn from the wrong place), streamProgram then draws the
+#   whole drawing again from home, and sendGCode sends its command again.
+
+READY_TIMEOUT = 10          #seconds to wait for the uArm to be ready
+PROBE_AFTER = 2.5           #seconds to wait for "@1" before asking the uArm if it is there (the bootloader must be left alone)
+PROBE_EVERY = 0.5           #seconds between asking
+PROBE_NUMBER = 10000        #command number of the question (the streams never use it)
+QUIET = 0.1                 #the uArm has finished its start-up messages when it has said nothing for this long (s)
+RECONNECT_TIMEOUT = 30      #seconds to wait for a dropped port to come back
 
 def openUArm(uArmPort):
-    '''Open the uArm serial port
+    '''Open the uArm serial port, and wait until the uArm is ready
     Typically port is /dev/ttyACM0'''
     
     uArm = serial.Serial(uArmPort,115200, timeout=2)
-    time.sleep(2)  #pause for a bit
-
-    #listen to the port for the uArm boot-up sequence, and print it
-    print(wait4Response(uArm,10))
-    time.sleep(2)  #pause for a bit
-    print(getResponse(uArm))
+    if not waitUntilReady(uArm, READY_TIMEOUT):
+        print("No answer from the uArm on", uArmPort)
     return uArm
 
+def waitUntilReady(uArm, timeOut):
+    '''Waits until the uArm says it has started ("@1"), or answers a question,
+    then for the rest of its start-up messages. Prints everything the uArm says.
+    Returns True if it is ready, False if there was no answer within timeOut seconds'''
+    reader = serialReader(uArm)
+    now = time.monotonic()
+    giveUp = now + timeOut
+    probeAt = now + PROBE_AFTER
+    while now < giveUp:
+        response = reader.get(max(0.0, min(giveUp, probeAt) - now))
+        if response is not None:
+            print(response.text)
+            if (response.kind == "event" and response.number == 1) or response.number == PROBE_NUMBER:
+                break
+        now = time.monotonic()
+        if now >= probeAt:
+            uArm.write(("#" + str(PROBE_NUMBER) + " P2220\n").encode("utf-8"))
+            probeAt = now + PROBE_EVERY
+    else:
+        return False
+
+    response = reader.get(QUIET)
+    while response is not None:             #the rest of the start-up messages (and answers to any other questions)
+        print(response.text)
+        response = reader.get(QUIET)
+    return True
+
+def reconnectUArm(uArm, timeOut=RECONNECT_TIMEOUT):
+    '''Reopens a uArm's serial port after it has dropped, and waits until the uArm is ready again
+    (the same serial.Serial object is reopened, so everything using it carries on)'''
+    print("Lost the uArm on", uArm.port, "- reconnecting")
+    reader = serialReaders.pop(uArm, None)
+    if reader is not None:
+        reader.stop()
+    stream = gCodeStreams.get(uArm)
+    if stream is not None:
+        stream.lost("disconnected")
+        stream.disconnected = True
+    try:
+        uArm.close()
+    except (serial.SerialException, OSError):
+        pass
+    if reader is not None:
+        reader.thread.join(1)               #make sure the old reader has let go of the port
+
+    giveUp = time.monotonic() + timeOut
+    while True:
+        try:
+            uArm.open()
+            break
+        except (serial.SerialException, OSError):
+            if time.monotonic() > giveUp:
+                raise
+            time.sleep(0.1)                 #wait for the USB device to come back
+    if not waitUntilReady(uArm, max(1.0, giveUp - time.monotonic())):
+        print("No answer from the uArm on", uArm.port)
+
+def writeUArm(uArm, data, resend=True):
+    '''Writes to the uArm, reconnecting if the port has dropped (and then writing again, unless resend is False)'''
+    try:
+        uArm.write(data)
+    except (serial.SerialException, OSError):
+        reconnectUArm(uArm)
+        if resend:
+            uArm.write(data)
+
+#==============================================================
+#   G-CODE TRACE
+#==============================================================
+#
+#   Set TRACE_FILE (eg: uArmFunctions.TRACE_FILE = "gcode.trace") to record
+#   every line sent to and received from every uArm, one JSON line each:
+#       {"time": 1.204113, "port": "/dev/ttyACM0", "sent": "#12 G0 X150 Y0"}
+#       {"time": 1.311942, "port": "/dev/ttyACM0", "received": "$12 ok"}
+#   (time is in seconds from the start of the trace). gCodeTools.py replays a
+#   trace on a uArm or the emulator, and estimates how long it should take.
+
+TRACE_FILE = None   #file to record the g-code trace in (None for no trace)
+traceFile = None
+traceStart = 0.0
+traceLock = threading.Lock()    #the reader threads and the senders all write to it
+
+def traceGCode(ser, direction, line):
+    """ Records a line "sent" to or "received" from a uArm in the trace (if there is one) """
+    global traceFile, traceStart
+    if TRACE_FILE is None:
+        return
+    with traceLock:
+        if traceFile is None or traceFile.name != TRACE_FILE:
+            if traceFile is not None:
+                traceFile.close()
+            traceFile = open(TRACE_FILE, "w")
+            traceStart = time.perf_counter()
+        entry = {"time": round(time.perf_counter() - traceStart, 6), "port": getattr(ser, "port", None), direction: line}
+        traceFile.write(json.dumps(entry) + "\n")
+        traceFile.flush()
+
+#==============================================================
+#   READING FROM THE UARM
+#==============================================================
+#
+#   Each serial port has a SerialReader thread that blocks on the port (so it
+#   uses no CPU while the arm is moving), reads whatever has arrived in one go,
+#   splits it into lines and puts each line on a queue as a Response:
+#       kind    "ok", "error", "event" (eg: "@1" when the uArm starts, or a
+#               position report "@3 X154.49 Y194.74 Z10.56"), "text", or
+#               "closed" when the port has dropped (the last one)
+#       number  the command number of a reply ("$12 ok") or the event number ("@3"), else None
+#       code    the error code of an error (eg: "E22"), else None
+#       values  {letter: number} for any values in the line (eg: {"X": 154.49, ...})
+#       text    the whole line
+#   wait4Response and getResponse read the lines from the queue.
+
+Response = collections.namedtuple("Response", "kind number code values text")
+
+def parseResponse(line):
+    """ Returns the Response for one line from the uArm """
+    text = line.strip()
+    words = text.split()
+    number = None
+    event = False
+    if words and words[0][:1] in ("$", "@") and words[0][1:].isdigit():
+        number = int(words[0][1:])
+        event = words[0][0] == "@"
+        words = words[1:]
+
+    kind = "text"
+    code = None
+    if event:
+        kind = "event"
+    elif words and words[0].lower() == "ok":
+        kind = "ok"
+        words = words[1:]
+    elif words and words[0][:1] == "E" and words[0][1:].isdigit():
+        kind = "error"
+        code = words[0]
+        words = words[1:]
+
+    values = {}
+    for word in words:
+        try:
+            values[word[0]] = float(word[1:])
+        except ValueError:
+            pass
+    return Response(kind, number, code, values, text)
+
+class SerialReader:
+    """ Reads lines from a serial port on its own thread and queues them as Responses
+            get(timeOut) - the next Response, waiting up to timeOut seconds (0 = don't wait), or None
+            stop()       - stop reading (the thread stops at its next read)
+    """
+
+    def __init__(self, ser):
+        self.ser = ser
+        self.responses = queue.Queue()
+        self.running = True
+        self.error = None           #the exception that stopped the thread (eg: the uArm was unplugged)
+        self.thread = threading.Thread(target=self.run, name="SerialReader " + str(getattr(ser, "port", "")), daemon=True)
+        self.thread.start()
+
+    def get(self, timeOut):
+        try:
+            if timeOut > 0:
+                return self.responses.get(timeout=timeOut)
+            return self.responses.get_nowait()
+        except queue.Empty:
+            return None
+
+    def stop(self):
+        self.running = False
+
+    def run(self):
+        buffer = bytearray()
+        while self.running:
+            try:
+                data = self.ser.read(max(1, self.ser.in_waiting))   #blocks until something arrives (or the port's timeout)
+            except Exception as error:
+                self.error = error
+                if self.running:
+                    self.responses.put(Response("closed", None, None, {}, "closed: " + str(error)))    #wake up whoever is waiting
+                break
+            if not data:
+                continue
+            buffer += data.replace(b"\r", b"\n")
+            end = buffer.find(b"\n")
+            while end >= 0:
+                line = buffer[:end].decode("utf-8", "replace")
+                del buffer[:end + 1]
+                if line.strip():
+                    traceGCode(self.ser, "received", line.strip())
+                    self.responses.put(parseResponse(line))
+                end = buffer.find(b"\n")
+        self.running = False
+
+serialReaders = {}          #serial port -> its SerialReader
+
+def serialReader(ser):
+    """ Returns the serial port's SerialReader, starting one if it hasn't got one """
+    reader = serialReaders.get(ser)
+    if reader is None or not reader.running:
+        reader = serialReaders[ser] = SerialReader(ser)
+    return reader
+
 def wait4Response(ser, timeOut):
     """ Waits for a 'line' response from the serial port
         Returns the string response
         If no response after timeOut, returns and empty string
     """
-    startTime = time.time()
-    Response = ""
-    while Response == "" and time.time()- startTime < timeOut:
-        if ser.inWaiting() > 0:
-            #time.sleep(1)
-            Response = ser.readline().decode("utf-8")
-    return Response
+    response = serialReader(ser).get(timeOut)
+    if response is None:
+        return ""
+    return response.text
 
 def getResponse(ser):
-    """ Returns any data from the serial input buffer
+    """ Returns any lines already read from the serial port
         No waiting, no timeout
     """
-    serData=""
-    while ser.inWaiting()>0:
-        serData =  serData + ser.read(1).decode("utf-8")
-    return serData
+    reader = serialReader(ser)
+    lines = []
+    response = reader.get(0)
+    while response is not None:
+        lines.append(response.text)
+        response = reader.get(0)
+    return "\n".join(lines)
 
+def closeUArm(uArm):
+    '''Stops reading from the uArm and closes its serial port'''
+    reader = serialReaders.pop(uArm, None)
+    if reader is not None:
+        reader.stop()
+    gCodeStreams.pop(uArm, None)
+    uArm.close()
 
 #==============================================================
 #   NEW FUNCTION - this works pretty well. Shouldn't need fixing
 #==============================================================
 
+@traceFunctions.traced("gcode")
 def sendGCode(uArm, gCode):
     '''Sends some g-code to the robot and waits for the robot to respond
     To make this really good, it would be good to check if the robot says "OK" or whether there
     is an error, and return either "TRUE" or an error number'''
     
     print("Sending: " + gCode)
-    uArm.write(("\r" + gCode + "\r").encode("utf-8"))
-    print("Received: ", wait4Response(uArm, 20))   #wait for response
+    for attempt in range(2):
+        traceGCode(uArm, "sent", gCode)
+        writeUArm(uArm, ("\r" + gCode + "\r").encode("utf-8"))
+        response = serialReader(uArm).get(20)      #wait for response
+        if response is None or response.kind != "closed":
+            break
+        reconnectUArm(uArm)                        #the port dropped before the reply: send it again
+    print("Received: ", response.text if response is not None else "")
     print(getResponse(uArm))                       #soak up any extra chars
 
+#==============================================================
+#   STREAMING G-CODE
+#==============================================================
+#
+#   sendGCode waits for the reply to each command before sending the next, so
+#   every command costs a full round trip. A GCodeStream numbers each command
+#   ("#12 G0 X150 Y0") and keeps sending until WINDOW commands are waiting for
+#   their replies, so the uArm's own command buffer is never empty (and never
+#   overflows, however long the drawing). Replies
+#   ("$12 ok", or an error such as "$12 E22") are matched to their commands by
+#   number, whatever order they come back in.
+#       send(gCode) - send a command (waits only if the window is full)
+#       flush()     - make sure everything sent has left the serial port
+#       barrier()   - wait until every command sent has been acknowledged (eg: before
+#                     taking a camera frame), returns the errors since the last barrier
+#   If the port drops, the commands waiting are counted as "disconnected" and
+#   nothing more is sent (each command is counted as "not sent") until the
+#   next barrier, as the uArm has restarted part way through them.
+#       query(gCode) - send a command and wait for its reply (a Response)
+#       sendProgram(program) - send a compiled drawing (drawingFunctions.Program), once the
+#                     commands before it are done: its encoded commands are written as
+#                     the window allows, as many in each write as there is room for
+#   The "gcode" span of each command is the time from when it was sent, or from
+#   the reply before it if that came later, until its reply: how long the uArm
+#   spent on it, even when it was waiting in the window.
+
+WINDOW = 4          #how many commands can be waiting for a reply at once
+ACK_TIMEOUT = 20    #seconds to wait for a reply before giving up on the commands waiting
+
+class GCodeStream:
+    """ Streams numbered g-code commands to a uArm, with up to 'window' waiting for replies """
+
+    def __init__(self, uArm, window=WINDOW):
+        self.uArm = uArm
+        self.window = window
+        self.sequence = 0
+        self.inFlight = {}          #command number -> (g-code, time sent)
+        self.errors = []            #(command number, g-code, reply) for commands that failed
+        self.lastReply = 0.0        #when the last reply came (perf_counter)
+        self.disconnected = False   #True from when the port drops until the next barrier (nothing is sent)
+
+    def send(self, gCode):
+        """ Sends a command, returns its number (or None if it wasn't sent, as the port has dropped) """
+        while len(self.inFlight) >= self.window and not self.disconnected:
+            if not self.readReply():
+                break
+        self.sequence = self.sequence % 9999 + 1
+        if not self.disconnected:
+            print("Sending: #" + str(self.sequence) + " " + gCode)
+            traceGCode(self.uArm, "sent", "#" + str(self.sequence) + " " + gCode)
+            writeUArm(self.uArm, ("#" + str(self.sequence) + " " + gCode + "\n").encode("utf-8"), resend=False)
+        if self.disconnected:
+            self.errors.append((self.sequence, gCode, "not sent"))
+            return None
+        self.inFlight[self.sequence] = (gCode, time.perf_counter())
+        return self.sequence
+
+    def lost(self, why):
+        """ Counts every command waiting for a reply as failed """
+        for number, (gCode, sent) in self.inFlight.items():
+            self.errors.append((number, gCode, why))
+        self.inFlight.clear()
+
+    def readReply(self):
+        """ Reads one line from the uArm and matches it to its command
+            Returns the Response, or None if nothing came back in time (the commands waiting are counted as failed)
+        """
+        reply = serialReader(self.uArm).get(ACK_TIMEOUT)
+        if reply is None:
+            print("No reply to", len(self.inFlight), "commands")
+            self.lost("timeout")
+            return None
+        if reply.kind == "closed":
+            reconnectUArm(self.uArm)
+            return reply
+
+        print("Received: ", reply.text)
+        if reply.kind in ("ok", "error") and reply.number in self.inFlight:
+            gCode, sent = self.inFlight.pop(reply.number)
+            now = time.perf_counter()
+            traceFunctions.record("gcode", now - max(sent, self.lastReply))
+            self.lastReply = now
+            if reply.kind == "error":
+                self.errors.append((reply.number, gCode, reply.code))
+        return reply
+
+    def query(self, gCode):
+        number = self.send(gCode)
+        while number in self.inFlight:
+            reply = self.readReply()
+            if reply is None:
+                return None
+            if reply.number == number and reply.kind in ("ok", "error"):
+                return reply
+        return None
+
+    def sendProgram(self, program):
+        while self.inFlight and self.readReply():
+            pass
+        print("Sending:", program.name, "(" + str(len(program.gCodes)) + " commands)")
+        first = 0
+        while first < len(program.gCodes) and not self.disconnected:
+            while len(self.inFlight) >= self.window and not self.disconnected:
+                if not self.readReply():
+                    break
+            if self.disconnected:
+                break
+            last = min(len(program.gCodes), first + max(1, self.window - len(self.inFlight)))
+            if TRACE_FILE is not None:
+                for number, gCode in zip(program.numbers[first:last], program.gCodes[first:last]):
+                    traceGCode(self.uArm, "sent", "#" + str(number) + " " + gCode)
+            writeUArm(self.uArm, b"".join(program.lines[first:last]), resend=False)
+            if self.disconnected:
+                break
+            sent = time.perf_counter()
+            for number, gCode in zip(program.numbers[first:last], program.gCodes[first:last]):
+                self.inFlight[number] = (gCode, sent)
+            first = last
+        if self.disconnected:
+            for number, gCode in zip(program.numbers[first:], program.gCodes[first:]):
+                self.errors.append((number, gCode, "not sent"))
+
+    def flush(self):
+        try:
+            self.uArm.flush()
+        except (serial.SerialException, OSError):
+            pass                            #the port has dropped, the next read or write reconnects
+
+    def barrier(self):
+        self.flush()
+        while self.inFlight and self.readReply():
+            pass
+        errors, self.errors = self.errors, []
+        self.disconnected = False
+        for number, gCode, result in errors:
+            print("Error: #" + str(number), gCode, "->", result)
+        return errors
+
+gCodeStreams = {}           #uArm -> its GCodeStream
+
+def gCodeStream(uArm):
+    """ Returns the uArm's GCodeStream (each uArm has one, so replies are always matched to the right command) """
+    stream = gCodeStreams.get(uArm)
+    if stream is None:
+        stream = gCodeStreams[uArm] = GCodeStream(uArm)
+    return stream
+
+def streamGCode(uArm, gCodes):
+    """ Sends a list of g-code commands, pipelined, and waits until they have all been done
+        Returns the errors (see GCodeStream.barrier)
+    """
+    stream = gCodeStream(uArm)
+    for gCode in gCodes:
+        stream.send(gCode)
+    return stream.barrier()
+
+def restarted(errors):
+    """ Returns True if the uArm restarted (its port dropped) while the commands were being done """
+    return any(result == "disconnected" for number, gCode, result in errors)
+
+def streamProgram(uArm, program, retries=1):
+    """ Sends a compiled drawing (drawingFunctions.Program) and waits until it has been done
+        If the uArm restarts part way through, it is drawn again from the start, from home with the pen up
+        Returns the errors (see GCodeStream.barrier)
+    """
+    stream = gCodeStream(uArm)
+    stream.sendProgram(program)
+    errors = stream.barrier()
+    while restarted(errors) and retries > 0:
+        retries = retries - 1
+        print("The uArm restarted during", program.name, "- drawing it again")
+        streamGCode(uArm, penUpHomeGCode())
+        stream.sendProgram(program)
+        errors = stream.barrier()
+    return errors
+
+#==============================================================
+#   MOVING AND DRAWING
+#==============================================================
+#
+#   Each drawing is compiled once by drawingFunctions.py (planned from its
+#   strokes, for the board geometry there) into a Program, which the draw
+#   functions stream to the uArm. boardGCode, noughtGCode, ... return
+#   the g-code commands of each drawing.
+
+def penUpHomeGCode():
+    '''Returns the g-code that lifts the pen where it is, then takes it home (where every drawing starts)'''
+    geometry = drawingFunctions.geometry
+    penUp = drawingFunctions.number(geometry.penUpZ)
+    return ["G0 Z" + penUp + " F" + drawingFunctions.number(geometry.travelFeed),
+            "G0 X" + drawingFunctions.number(geometry.home[0]) + " Y" + drawingFunctions.number(geometry.home[1]) + " Z" + penUp]
+
+@traceFunctions.traced()
 def goHome(uArm):
     '''Puts the uArm into the home position'''
-    sendGCode(uArm, "G0 X150 Y0 Z0 F20000")    #pen up (if not already up)
+    streamGCode(uArm, ["G0 X150 Y0 Z0 F20000"])    #pen up (if not already up)
     
+STILL_TIMEOUT = 10          #seconds to wait for the uArm to stop moving
+STILL_POLL = 0.05           #seconds between asking it
+
+def waitUntilStill(uArm, timeOut=STILL_TIMEOUT):
+    '''Waits until the uArm has stopped moving (asks it with M2200 until it says it isn't)
+    Returns False if it was still moving after timeOut seconds'''
+    stream = gCodeStream(uArm)
+    giveUp = time.monotonic() + timeOut
+    while True:
+        reply = stream.query("M2200")
+        if reply is None or reply.kind != "ok" or reply.values.get("V") != 1:
+            return True                     #stopped (or it can't tell us)
+        if time.monotonic() > giveUp:
+            return False
+        time.sleep(STILL_POLL)
+
+@traceFunctions.traced()
 def goVision(uArm):
-    '''Puts the uArm into camera vision position'''
-    sendGCode(uArm, "G0 Z20")     #pen up
-    #sendGCode(uArm, "G0 X150 Y0 Z0 F20000")    #pen up (if not already up)
-    
-    sendGCode(uArm, "G0 X70 Y90 Z20") #position for best camera view
-    
+    '''Puts the uArm into camera vision position (and waits until it is there and has stopped)'''
+    streamGCode(uArm, [
+        "G0 Z20",               #pen up
+        "G0 X70 Y90 Z20",       #position for best camera view
+    ])
+    waitUntilStill(uArm)
+
+def boardGCode():
+    '''Returns the g-code that draws the board'''
+    return list(drawingFunctions.programs["board", None].gCodes)
+
+def noughtGCode(whichSquare):
+    '''Returns the g-code that draws a nought in square "whichSquare"'''
+    return list(drawingFunctions.programs["O", whichSquare].gCodes)
+
+def crossGCode(whichSquare):
+    '''Returns the g-code that draws a cross in square "whichSquare"'''
+    return list(drawingFunctions.programs["X", whichSquare].gCodes)
+
+def winLineGCode(winLine):
+    '''Returns the g-code that draws a line through a winning line (eg: "012"), or [] for no line'''
+    program = drawingFunctions.programs.get(("line", winLine))
+    if program is None:
+        return []
+    return list(program.gCodes)
+
+@traceFunctions.traced()
 def drawBoard(uArm):
     '''Draws the board'''
-    sendGCode(uArm, "G0 X150 Y0 Z10")  
-    sendGCode(uArm, "G0 X150 Y25 Z10")
-    sendGCode(uArm, "G0 X150 Y25 Z0")
-    sendGCode(uArm, "G0 X225 Y25 Z0")
-    sendGCode(uArm, "G0 X225 Y25 Z10")
-    sendGCode(uArm, "G0 X200 Y0 Z10")
-    sendGCode(uArm, "G0 X200 Y0 Z0")
-    sendGCode(uArm, "G0 X200 Y75 Z0")
-    sendGCode(uArm, "G0 X200 Y075 Z10")
-    sendGCode(uArm, "G0 X225 Y50 Z10")
-    sendGCode(uArm, "G0 X225 Y50 Z0")
-    sendGCode(uArm, "G0 X150 Y50 Z0")
-    sendGCode(uArm, "G0 X150 Y50 Z10")
-    sendGCode(uArm, "G0 X175 Y75 Z10")  
-    sendGCode(uArm, "G0 X175 Y75 Z0")
-    sendGCode(uArm, "G0 X175 Y0 Z0")
-    sendGCode(uArm, "G0 X175 Y0 Z10")
-    sendGCode(uArm, "G0 X150 Y0 Z10")
-    sendGCode(uArm, "G0 X150 Y0 Z10")
+    streamProgram(uArm, drawingFunctions.programs["board", None])
     
+@traceFunctions.traced()
 def drawNought(uArm, whichSquare):
     '''Draws a nought at the position on the board specified by "whichSquare")
     eg: drawNought(1) draws a nought in square 1
@@ -95,63 +553,13 @@ def drawNought(uArm, whichSquare):
       -----
       6|7|8    '''
 
-    #work out starting position based on which square:
-    if whichSquare == 0:
-        x=150
-        y=0
-    elif whichSquare == 1:
-        x=150
-        y=25
-    elif whichSquare == 2:
-        x=150
-        y=50
-    elif whichSquare == 3:
-        x=175
-        y=0
-    elif whichSquare == 4:
-        x=175
-        y=25
-    elif whichSquare == 5:
-        x=175
-        y=50
-    elif whichSquare == 6:
-        x=200
-        y=0
-    elif whichSquare == 7:
-        x=200
-        y=25
-    elif whichSquare == 8:
-        x=200
-        y=50
-
-
-    sendGCode(uArm, "G0 Z50")    #pen up (if not already up)
-    sendGCode(uArm, "G0 X" + str(x) + " Y"+ str(y))   #got to the starting location
-    
-    sendGCode(uArm, "G91")       #switch to relative move mode
-    sendGCode(uArm, "G0 X5 Y10")
-    
-    sendGCode(uArm, "G90")       #switch back to absolute mode
-    sendGCode(uArm, "G0 Z0")     #pen down
-    sendGCode(uArm, "G91")       #switch to relative move mode
-
-    #draw the nought
-    sendGCode(uArm, "G0 Y5")
-    sendGCode(uArm, "G0 X5 Y5")
-    sendGCode(uArm, "G0 X5 ")
-    sendGCode(uArm, "G0 X5 Y-5")
-    sendGCode(uArm, "G0 Y-5")    
-    sendGCode(uArm, "G0 X-5 Y-5")
-    sendGCode(uArm, "G0 X-5")
-    sendGCode(uArm, "G0 X-5 Y5")
-
-    sendGCode(uArm, "G90")       #switch back to absolute mode
-    sendGCode(uArm, "G0 Z50")    #pen up
+    streamProgram(uArm, drawingFunctions.programs["O", whichSquare])
 
+@traceFunctions.traced()
 def drawCross(uArm, whichSquare):
     '''Draws a cross at the position on the board specified by "whichSquare")
-    eg: drawCross(1) draws a nought in square 1
-        drawCross(2) draws a nought in square 2
+    eg: drawCross(1) draws a cross in square 1
+        drawCross(2) draws a cross in square 2
     squares are as follows:
       0|1|2
       -----
@@ -159,118 +567,17 @@ def drawCross(uArm, whichSquare):
       -----
       6|7|8    '''
 
-    #work out starting position based on which square:
-    #(These are wrong... needs work!)
-    if whichSquare == 0:
-        x=150
-        y=0
-    elif whichSquare == 1:
-        x=150
-        y=25
-    elif whichSquare == 2:
-        x=150
-        y=50
-    elif whichSquare == 3:
-        x=175
-        y=0
-    elif whichSquare == 4:
-        x=175
-        y=25
-    elif whichSquare == 5:
-        x=175
-        y=50
-    elif whichSquare == 6:
-        x=200
-        y=0
-    elif whichSquare == 7:
-        x=200
-        y=25
-    elif whichSquare == 8:
-        x=200
-        y=50
-
-
-    sendGCode(uArm, "G0 Z50")    #pen up (if not already up)
-    sendGCode(uArm, "G0 X" + str(x) + " Y"+ str(y))   #go to the starting location
-    
-    sendGCode(uArm, "G91")       #switch to relative move mode
-    sendGCode(uArm, "G0 X5 Y5")
-    
-    sendGCode(uArm, "G90")       #switch back to absolute mode
-    sendGCode(uArm, "G0 Z0")     #pen down
-    sendGCode(uArm, "G91")       #switch to relative move mode
-
-    #draw the cross
-    sendGCode(uArm, "G0 X15 Y15")
-    sendGCode(uArm, "G0 Z20")     #pen up
-    sendGCode(uArm, "G0 X-15")
-    sendGCode(uArm, "G0 Z-20")    #pen down
-    sendGCode(uArm, "G0 X15 Y-15")
-    sendGCode(uArm, "G0 Z0")
-
-    sendGCode(uArm, "G90")       #switch back to absolute mode
-    sendGCode(uArm, "G0 Z50")    #pen up
+    streamProgram(uArm, drawingFunctions.programs["X", whichSquare])
 
+@traceFunctions.traced()
 def drawWinLine(uArm, winLine):
     '''Draws a line through the winning positions
        Parameters: uArm - the robot arm to do the drawing
-                   winLine - a string representing the positions to draw through
-                   eg: "012" or "248" or "147"
+                   winLine - a string representing the positions to draw through,
+                   as returned by gameFunctions.checkWin
+                   eg: "012" or "246" or "147" ("" means no winning line, so nothing is drawn)
     '''
     
-    sendGCode(uArm, "G0 Z50")    #pen up (if not already up)
-    
-    if winLine == "012":
-        #put some code to draw a line through "012"
-        sendGCode(uArm, "G0 X162.5 Y0")
-        sendGCode(uArm, "G0 Z0")
-        sendGCode(uArm, "G0 X162.5 Y75")
-        
-    elif winLine == "258":
-        #puts some code to draw a line through "345"  
-        sendGCode(uArm, "G0 X150 Y62.5")
-        sendGCode(uArm, "G0 Z0")
-        sendGCode(uArm, "G0 X225 Y62.5")
-        
-    elif winLine == "345":
-        #puts some code to draw a line through "345"  
-        sendGCode(uArm, "G0 X187.5 Y0")
-        sendGCode(uArm, "G0 Z0")
-        sendGCode(uArm, "G0 X187.5 Y75")
-        
-    elif winLine == "678":
-        #puts some code to draw a line through "345"  
-        sendGCode(uArm, "G0 X212.5 Y0")
-        sendGCode(uArm, "G0 Z0")
-        sendGCode(uArm, "G0 X212.5 Y75")
-        
-    elif winLine == "147":
-        #puts some code to draw a line through "345"  
-        sendGCode(uArm, "G0 X150 Y37.5")
-        sendGCode(uArm, "G0 Z0")
-        sendGCode(uArm, "G0 X225 Y37.5")
-        
-    elif winLine == "036":
-        #puts some code to draw a line through "345"  
-        sendGCode(uArm, "G0 X150 Y12.5")
-        sendGCode(uArm, "G0 Z0")
-        sendGCode(uArm, "G0 X225 Y12.5")
-        
-    elif winLine == "246":
-        #puts some code to draw a line through "345"  
-        sendGCode(uArm, "G0 X150 Y75")
-        sendGCode(uArm, "G0 Z0")
-        sendGCode(uArm, "G0 X225 Y0")
-        
-    elif winLine == "048":
-        #puts some code to draw a line through "345"  
-        sendGCode(uArm, "G0 X150 Y0")
-        sendGCode(uArm, "G0 Z0")
-        sendGCode(uArm, "G0 X225 Y75")
-        
-    
-    #need code for the following winLines:  012, 345, 678, 036, 147, 258, 048, 246
-    
-    sendGCode(uArm, "G0 Z50")    #pen up
-        
-
+    program = drawingFunctions.programs.get(("line", winLine))
+    if program is not None:
+        streamProgram(uArm, program)